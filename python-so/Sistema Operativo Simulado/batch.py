@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+from itertools import product
+from multiprocessing import Pool, cpu_count
+from tabulate import tabulate
+from hardware import *
+from so import *
+from workload import SyntheticWorkload
+
+
+## describe una corrida completa del simulador:
+##   - scheduler: la clase del scheduler y los parametros de su constructor, ej: (RoundRobinScheduler, (3,))
+##   - memorySize: tamaño de memoria que recibe Hardware.setup
+##   - programs: lista de (instrucciones, prioridad), (instrucciones, prioridad, tickDeLlegada)
+##     o (instrucciones, prioridad, tickDeLlegada, deadline), donde las instrucciones son las mismas
+##     que recibe Program, ej: [ASM.CPU(2), ASM.IO()], y el deadline es relativo a la llegada.
+##     Tambien puede ser un SyntheticWorkload: los programas se generan a medida que llegan
+##   - replacement: politica de reemplazo de paginas y sus parametros, ej: (AgingReplacement, (8,));
+##     None para la del kernel (FIFO)
+## Todo lo que contiene tiene que poder serializarse (pickle) para mandarlo a otro proceso
+class Scenario():
+
+    def __init__(self, name, scheduler, memorySize, programs, replacement = None):
+        self._name = name
+        self._scheduler = scheduler
+        self._memorySize = memorySize
+        self._programs = programs
+        self._replacement = replacement
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def scheduler(self):
+        return self._scheduler
+
+    @property
+    def memorySize(self):
+        return self._memorySize
+
+    @property
+    def programs(self):
+        return self._programs
+
+    @property
+    def replacement(self):
+        return self._replacement
+
+    def schedulerName(self):
+        return _describe(self._scheduler)
+
+    def replacementName(self):
+        if self._replacement is None:
+            return FIFOReplacement.__name__
+        return _describe(self._replacement)
+
+    def __repr__(self):
+        return "Scenario({name}, {scheduler}, mem={mem}, {replacement})".format(
+            name=self._name, scheduler=self.schedulerName(), mem=self._memorySize, replacement=self.replacementName())
+
+
+def _describe(component):
+    componentClass, args = component
+    params = ", ".join(str(arg) for arg in args)
+    return "{name}({params})".format(name=componentClass.__name__, params=params)
+
+
+## arma la grilla de escenarios: todas las combinaciones de scheduler x memoria x workload x reemplazo
+##   - schedulers: lista de (clase, parametros)
+##   - memorySizes: lista de tamaños de memoria
+##   - workloads: diccionario nombre -> lista de programas (ver Scenario)
+##   - replacements: lista de politicas de reemplazo (clase, parametros); por default solo la del kernel
+def scenarioGrid(schedulers, memorySizes, workloads, replacements = (None,)):
+    scenarios = []
+    for scheduler, memorySize, workload, replacement in product(schedulers, memorySizes, sorted(workloads), replacements):
+        scenarios.append(Scenario(workload, scheduler, memorySize, workloads[workload], replacement))
+    return scenarios
+
+
+## corre un escenario en una maquina propia (en tiempo virtual, salteando los ticks sin eventos)
+## devuelve el kernel (para sacarle las metricas) y la cantidad de ticks simulados
+def simulate(scenario, maxTicks = 1000000):
+    hardware = Hardware()
+    hardware.setup(scenario.memorySize, eventDriven = True)
+    hardware.cpu.enable_stats = True
+
+    schedulerClass, args = scenario.scheduler
+    replacementPolicy = None
+    if scenario.replacement is not None:
+        replacementClass, replacementArgs = scenario.replacement
+        replacementPolicy = replacementClass(*replacementArgs)
+    kernel = Kernel(schedulerClass(*args), hardware, replacementPolicy = replacementPolicy)
+
+    if isinstance(scenario.programs, SyntheticWorkload):
+        scenario.programs.submit(kernel)
+        return kernel, kernel.run_until_idle(maxTicks)
+
+    for i, program in enumerate(scenario.programs):
+        path = "c:/prg{i}.exe".format(i=i)
+        kernel.fileSystem.write(path, Program(program[0]))
+        deadline = program[3] if len(program) > 3 else None
+        if len(program) > 2 and program[2] > 0:
+            kernel.runAt(program[2], path, program[1], deadline)
+        else:
+            kernel.run(path, program[1], deadline)
+
+    ticks = kernel.run_until_idle(maxTicks)
+    return kernel, ticks
+
+
+## corre un escenario y devuelve sus metricas
+def runScenario(scenario, maxTicks = 1000000):
+    kernel, ticks = simulate(scenario, maxTicks)
+
+    summary = kernel.gantt.summary()
+    pids = summary['pids']
+    finished = [turnaround for turnaround in summary['turnaround'] if turnaround is not None]
+    waitings = summary['waiting']
+    latenesses = [lateness for lateness in summary['lateness'] if lateness is not None]
+
+    return {
+        'scenario': scenario.name,
+        'scheduler': scenario.schedulerName(),
+        'memory': scenario.memorySize,
+        'replacement': scenario.replacementName(),
+        'processes': len(pids),
+        'finished': len(finished),
+        'ticks': ticks,
+        'avgTurnaround': _average(finished),
+        'avgWaiting': _average(waitings),
+        'contextSwitches': kernel.getDispatcher().contextSwitches,
+        'pageFaults': kernel.loader.pageFaults,
+        'faultRate': kernel.memoryManager.faultRate(),
+        'tlbHitRate': kernel.hardware.mmu.tlbHitRate(),
+        'missedDeadlines': len(kernel.gantt.missedDeadlines()),
+        'maxLateness': max(latenesses) if latenesses else None,
+    }
+
+
+def _average(values):
+    if not values:
+        return None
+    return sum(values) / len(values)
+
+
+## reparte los escenarios entre un pool de procesos (por default, uno por core)
+## y devuelve las metricas en el mismo orden que los escenarios
+def runBatch(scenarios, processes = None):
+    if processes is None:
+        processes = cpu_count()
+    with Pool(processes) as pool:
+        return pool.map(runScenario, scenarios, chunksize=1)
+
+
+def print_results(results):
+    if not results:
+        return
+    headers = list(results[0].keys())
+    rows = [[result[header] for header in headers] for result in results]
+    print(tabulate(rows, headers=headers, tablefmt='psql', floatfmt='.2f'))
+
+
+##
+##  Ejemplo: los programas de main.py con los distintos schedulers
+##
+if __name__ == '__main__':
+    mainWorkload = [
+        ([ASM.CPU(2), ASM.IO(), ASM.CPU(3), ASM.IO(), ASM.CPU(2)], 3),
+        ([ASM.CPU(7)], 2),
+        ([ASM.CPU(4), ASM.IO(), ASM.CPU(1)], 1),
+        ([ASM.CPU(1), ASM.IO(), ASM.CPU(1), ASM.IO(), ASM.CPU(1)], 3),
+        ([ASM.CPU(3), ASM.IO(), ASM.CPU(2), ASM.IO(), ASM.CPU(1)], 4),
+        ([ASM.CPU(5), ASM.IO(), ASM.CPU(2)], 4),
+    ]
+
+    schedulers = [(FCFSScheduler, ())]
+    schedulers += [(RoundRobinScheduler, (quantum,)) for quantum in range(1, 6)]
+    schedulers += [(PrioritySchedulerExp, (quantum,)) for quantum in range(1, 6)]
+
+    scenarios = scenarioGrid(schedulers, [400], {'main': mainWorkload})
+    print_results(runBatch(scenarios))
@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+import argparse
+import json
+import platform
+import time
+from multiprocessing import Pool
+from batch import Scenario, simulate, print_results, _average
+from hardware import *
+from so import *
+from workload import SyntheticWorkload, mean
+
+try:
+    import resource
+except ImportError:
+    # resource solo existe en Unix: sin el no se mide el pico de memoria
+    resource = None
+
+
+## todos los schedulers de so.py, con parametros razonables para comparar entre si
+SCHEDULERS = [
+    (FCFSScheduler, ()),
+    (RoundRobinScheduler, (3,)),
+    (RoundRobinScheduler, (3, True)),
+    (WeightedRoundRobinScheduler, (1,)),
+    (PrioritySchedulerNoExp, (3,)),
+    (PrioritySchedulerExp, (3,)),
+    (LazyPrioritySchedulerNoExp, (3,)),
+    (LazyPrioritySchedulerExp, (3,)),
+    (MLFQScheduler, ()),
+    (CFSScheduler, ()),
+    (SJFScheduler, ()),
+    (SRTFScheduler, ()),
+    (LotteryScheduler, (3,)),
+    (StrideScheduler, (3,)),
+    (EDFScheduler, ()),
+    (RateMonotonicScheduler, ()),
+]
+
+SIZES = [10, 1000, 100000]
+
+## frames de memoria de cada corrida: los procesos terminados liberan sus frames,
+## alcanza con que entren los que estan vivos a la vez
+MEMORY_SIZE = 4096 * 4
+
+
+##
+##  Workloads sinteticos (ver SyntheticWorkload): las llegadas son de Poisson, con una tasa que
+##  deja al sistema cargado al ~90% para que la cola no crezca sin limite
+##
+WORKLOADS = {
+    # rafagas largas de CPU y casi nada de I/O
+    'cpu': dict(cpuBurst=('uniform', 8, 20), ioOperations=('constant', 1)),
+    # rafagas cortas de CPU entre operaciones de I/O
+    'io': dict(cpuBurst=('uniform', 1, 2), ioOperations=('constant', 4)),
+    # rafagas de largo exponencial y una cantidad variable de I/O
+    'mixed': dict(cpuBurst=('exponential', 6), ioOperations=('uniform', 0, 4), priorities=(1, 2, 4, 2, 1)),
+    # como mixed, pero llegan en grupos de hasta 20 programas
+    'bursty': dict(cpuBurst=('exponential', 6), ioOperations=('uniform', 0, 4), arrivalBatch=('uniform', 1, 20)),
+}
+
+LOAD = 0.9
+
+
+def syntheticWorkload(name, count, seed = 0):
+    parameters = WORKLOADS[name]
+    cpu, io = SyntheticWorkload(count, **parameters).meanDemand()
+    batch = mean(parameters.get('arrivalBatch', ('constant', 1)))
+    return SyntheticWorkload(count, seed, arrivalRate = LOAD / (max(cpu, io) * batch), **parameters)
+
+
+##
+##  Corrida de un escenario con metricas de la simulacion y del host
+##
+
+def runBenchmark(scenario, maxTicks = 100000000):
+    start = time.perf_counter()
+    kernel, ticks = simulate(scenario, maxTicks)
+    wallTime = time.perf_counter() - start
+
+    summary = kernel.gantt.summary()
+    finished = [turnaround for turnaround in summary['turnaround'] if turnaround is not None]
+    responses = [response for response in summary['response'] if response is not None]
+
+    return {
+        'scenario': scenario.name,
+        'scheduler': scenario.schedulerName(),
+        'processes': len(scenario.programs),
+        'finished': len(finished),
+        'ticks': ticks,
+        'throughput': len(finished) / ticks if ticks else None,
+        'avgTurnaround': _average(finished),
+        'avgWaiting': _average(summary['waiting']),
+        'avgResponse': _average(responses),
+        'contextSwitches': kernel.getDispatcher().contextSwitches,
+        'wallTime': wallTime,
+        'usPerTick': 1e6 * wallTime / ticks if ticks else None,
+        'peakRssKb': _peakRss(),
+    }
+
+
+## pico de memoria residente del proceso (en KB; ru_maxrss esta en KB en Linux y en bytes en macOS)
+def _peakRss():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if platform.system() == 'Darwin':
+        peak //= 1024
+    return peak
+
+
+## corre cada escenario en un proceso nuevo (asi el pico de memoria es el de ese escenario)
+def runBenchmarks(scenarios, processes = None):
+    with Pool(processes, maxtasksperchild=1) as pool:
+        return pool.map(runBenchmark, scenarios, chunksize=1)
+
+
+def benchmarkScenarios(schedulers, sizes, workloads, seed = 0):
+    scenarios = []
+    for name in workloads:
+        for size in sizes:
+            programs = syntheticWorkload(name, size, seed)
+            for scheduler in schedulers:
+                scenarios.append(Scenario("{name}-{size}".format(name=name, size=size), scheduler, MEMORY_SIZE, programs))
+    return scenarios
+
+
+def writeResults(path, results):
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+    with open(path, 'w') as out:
+        json.dump(report, out, indent=2)
+
+
+## compara contra un reporte anterior: lista los escenarios cuyas metricas simuladas cambiaron
+## o cuyo tiempo por tick empeoro mas de "tolerance" (ej: 0.2 = 20%)
+def compareResults(baseline, results, tolerance = 0.2):
+    simulated = ['finished', 'ticks', 'avgTurnaround', 'avgWaiting', 'avgResponse', 'contextSwitches']
+    previous = {(result['scenario'], result['scheduler']): result for result in baseline['results']}
+    regressions = []
+    for result in results:
+        old = previous.get((result['scenario'], result['scheduler']))
+        if old is None:
+            continue
+        for metric in simulated:
+            if old[metric] != result[metric]:
+                regressions.append((result['scenario'], result['scheduler'], metric, old[metric], result[metric]))
+        if old['usPerTick'] and result['usPerTick'] and result['usPerTick'] > old['usPerTick'] * (1 + tolerance):
+            regressions.append((result['scenario'], result['scheduler'], 'usPerTick', old['usPerTick'], result['usPerTick']))
+    return regressions
+
+
+##
+##  Ejemplo: python benchmark.py --sizes 10 1000 --workloads cpu io --output bench.json
+##           python benchmark.py --sizes 10 1000 --baseline bench.json
+##
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark de los schedulers con workloads sinteticos")
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    parser.add_argument('--workloads', nargs='+', choices=sorted(WORKLOADS), default=sorted(WORKLOADS))
+    parser.add_argument('--schedulers', nargs='+', help="nombres de clase (por default, todos)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--processes', type=int, help="procesos en paralelo (por default, uno por core)")
+    parser.add_argument('--output', default='benchmark.json')
+    parser.add_argument('--baseline', help="reporte anterior contra el que comparar")
+    options = parser.parse_args()
+
+    schedulers = SCHEDULERS
+    if options.schedulers:
+        schedulers = [scheduler for scheduler in SCHEDULERS if scheduler[0].__name__ in options.schedulers]
+
+    results = runBenchmarks(benchmarkScenarios(schedulers, options.sizes, options.workloads, options.seed), options.processes)
+    print_results(results)
+    writeResults(options.output, results)
+
+    if options.baseline:
+        with open(options.baseline) as baselineFile:
+            regressions = compareResults(json.load(baselineFile), results)
+        for scenario, scheduler, metric, old, new in regressions:
+            print("REGRESION {scenario} {scheduler}: {metric} {old} -> {new}".format(
+                scenario=scenario, scheduler=scheduler, metric=metric, old=old, new=new))
@@ -3,7 +3,9 @@
 from tabulate import tabulate
 from time import sleep
 from threading import Thread, Lock
+import heapq
 import log
+from collections import OrderedDict
 
 ##  Estas son la instrucciones soportadas por nuestro CPU
 INSTRUCTION_IO = 'IO'
@@ -18,9 +20,12 @@ class ASM():
     def EXIT(self, times):
         return [INSTRUCTION_EXIT] * times
 
+    ## ticks: lo que tarda el dispositivo en esta operacion (por default, su tiempo fijo)
     @classmethod
-    def IO(self):
-        return INSTRUCTION_IO
+    def IO(self, ticks = None):
+        if ticks is None:
+            return INSTRUCTION_IO
+        return "{io}:{ticks}".format(io=INSTRUCTION_IO, ticks=ticks)
 
     @classmethod
     def CPU(self, times):
@@ -32,7 +37,14 @@ class ASM():
 
     @classmethod
     def isIO(self, instruction):
-        return INSTRUCTION_IO == instruction
+        return isinstance(instruction, str) and instruction.startswith(INSTRUCTION_IO)
+
+    ## ticks de la operacion de I/O (None si usa el tiempo del dispositivo)
+    @classmethod
+    def ioTicks(self, instruction):
+        if instruction == INSTRUCTION_IO:
+            return None
+        return int(instruction[len(INSTRUCTION_IO) + 1:])
 
 
 ##  Estas son la interrupciones soportadas por nuestro Kernel
@@ -87,14 +99,33 @@ class InterruptVector():
 ## emulates the Internal Clock
 class Clock():
 
-    def __init__(self):
+    def __init__(self, virtualTime = False):
         self._subscribers = []
         self._running = False
         self._currentTick = 0
+        self._nextTick = 0
+        ## en modo "tiempo virtual" los ticks se ejecutan uno detras de otro, sin esperar
+        self._virtualTime = virtualTime
+        ## eventos programados para un tick dado: heap de (tick, secuencia, accion)
+        self._events = []
+        self._eventSeq = 0
 
     def addSubscriber(self, subscriber):
         self._subscribers.append(subscriber)
 
+    ## programa una accion (sin parametros) para que se ejecute al comienzo del tick indicado
+    def schedule(self, tickNbr, action):
+        heapq.heappush(self._events, (tickNbr, self._eventSeq, action))
+        self._eventSeq += 1
+
+    def hasPendingEvents(self):
+        return len(self._events) > 0
+
+    def _fireEvents(self, tickNbr):
+        while self._events and self._events[0][0] <= tickNbr:
+            _, _, action = heapq.heappop(self._events)
+            action()
+
     def stop(self):
         self._running = False
 
@@ -106,29 +137,118 @@ class Clock():
             t.start()
 
     def __start(self):
-        tickNbr = 0
         while (self._running):
-            self.tick(tickNbr)
-            tickNbr += 1
+            self.tick(self._nextTick)
 
     def tick(self, tickNbr):
         self._currentTick = tickNbr
+        self._nextTick = tickNbr + 1
         log.logger.info("        --------------- tick: {tickNbr} ---------------".format(tickNbr = tickNbr))
+        ## primero los eventos programados para este tick (ej: llegada de procesos)
+        self._fireEvents(tickNbr)
         ## notify all subscriber that a new clock cycle has started
         for subscriber in self._subscribers:
             subscriber.tick(tickNbr)
-        ## wait 1 second and keep looping
-        sleep(1)
+        ## wait 1 second and keep looping (only in real time mode)
+        if not self._virtualTime:
+            sleep(1)
 
     def do_ticks(self, times):
         log.logger.info("---- :::: CLOCK do_ticks: {times} ::: -----".format(times=times))
         for tickNbr in range(0, times):
             self.tick(tickNbr)
 
+    ## ejecuta "ticks" ciclos seguidos, continuando desde el ultimo tick ejecutado
+    def run_for(self, ticks):
+        log.logger.info("---- :::: CLOCK run_for: {ticks} ::: -----".format(ticks=ticks))
+        for _ in range(0, ticks):
+            self.tick(self._nextTick)
+        return ticks
+
+    ## ejecuta ciclos hasta que se cumpla la condicion (o hasta maxTicks si se indica)
+    ## y devuelve la cantidad de ticks ejecutados
+    def run_until(self, condition, maxTicks = None):
+        ticks = 0
+        while not condition() and (maxTicks is None or ticks < maxTicks):
+            self.tick(self._nextTick)
+            ticks += 1
+        return ticks
+
     @property
     def currentTick(self):
         return self._currentTick
 
+    @property
+    def nextTick(self):
+        return self._nextTick
+
+    @property
+    def virtualTime(self):
+        return self._virtualTime
+
+    @virtualTime.setter
+    def virtualTime(self, virtualTime):
+        self._virtualTime = virtualTime
+
+## emulates the Internal Clock driven by discrete events
+## En vez de ejecutar todos los ticks, salta directamente al proximo tick donde algun
+## componente tiene algo para hacer. Cada suscriptor informa con ticksToEvent() cuantos
+## ticks pueden pasar sin que haga nada observable (None = ninguno pendiente) y con
+## skipTicks(n) avanza su estado interno esos n ticks de una sola vez.
+## Los eventos programados (llegadas de procesos) se mantienen en la cola de prioridad del Clock.
+class DiscreteEventClock(Clock):
+
+    def __init__(self):
+        super(DiscreteEventClock, self).__init__(virtualTime = True)
+
+    def run_for(self, ticks):
+        log.logger.info("---- :::: EVENT CLOCK run_for: {ticks} ::: -----".format(ticks=ticks))
+        done = 0
+        while done < ticks:
+            done += self._advance(ticks - done)
+        return ticks
+
+    def run_until(self, condition, maxTicks = None):
+        ticks = 0
+        while not condition() and (maxTicks is None or ticks < maxTicks):
+            budget = None if maxTicks is None else maxTicks - ticks
+            ticks += self._advance(budget)
+        return ticks
+
+    ## cantidad de ticks que pueden saltearse hasta el proximo evento (None si no hay ninguno)
+    def ticksToNextEvent(self):
+        nextEvent = None
+        if self._events:
+            nextEvent = max(self._events[0][0] - self._nextTick, 0)
+        for subscriber in self._subscribers:
+            ticks = subscriber.ticksToEvent()
+            if ticks is not None and (nextEvent is None or ticks < nextEvent):
+                nextEvent = ticks
+        return nextEvent
+
+    ## saltea los ticks sin eventos y ejecuta el tick del proximo evento
+    ## devuelve la cantidad de ticks que avanzo el clock
+    def _advance(self, budget):
+        skip = self.ticksToNextEvent()
+        if skip is None:
+            ## no hay nada pendiente: se consume el presupuesto (o se avanza de a un tick)
+            skip = 0 if budget is None else budget - 1
+        elif budget is not None:
+            skip = min(skip, budget - 1)
+        if skip > 0:
+            self._skip(skip)
+        self.tick(self._nextTick)
+        return skip + 1
+
+    def _skip(self, ticks):
+        self._currentTick = self._nextTick
+        log.logger.info("        --------------- skip ticks: {first} to {last} ---------------".format(first = self._currentTick, last = self._currentTick + ticks - 1))
+        for subscriber in self._subscribers:
+            subscriber.skipTicks(ticks)
+        self._nextTick += ticks
+        self._currentTick = self._nextTick - 1
+
+
 ## emulates the main memory (RAM)
 class Memory():
 
@@ -151,13 +271,34 @@ class Memory():
         ##return "Memoria = {mem}".format(mem=self._cells)
 
 ## emulates the Memory Management Unit (MMU)
+## TLB: cache de traducciones pagina -> frame de tamaño fijo (tlbSize entradas), con reemplazo LRU.
+## Las entradas estan etiquetadas con el espacio de direcciones (asid) del proceso, asi que
+## cambiar de proceso no la vacia: solo cambia la page table que se recorre cuando una pagina no esta (miss)
 class MMU():
 
-    def __init__(self, memory):
+    def __init__(self, memory, interruptVector, tlbSize = 64):
         self._memory = memory
+        self._interruptVector = interruptVector
         self._frameSize = 0
-        self._limit = 999
-        self._tlb = dict()
+        # ultima direccion logica valida del proceso actual (la fija el dispatcher)
+        self._limit = -1
+        # (asid, pagina) -> frame, de la usada hace mas tiempo a la mas reciente
+        self._tlb = OrderedDict()
+        self._tlbSize = tlbSize
+        self._tlbHits = 0
+        self._tlbMisses = 0
+        self._tlbFlushes = 0
+        # espacio de direcciones actual y la page table que se recorre en cada miss
+        self._asid = None
+        self._pageTable = dict()
+        # bits por frame para los algoritmos de reemplazo: referenciado (se leyo o escribio) y
+        # modificado (se escribio); los que el SO borra con clearReferenced / resetFrameBits
+        self._referenced = bytearray()
+        self._dirty = bytearray()
+        # frames que pasaron de no referenciados a referenciados (solo si alguien lo pidio con trackTouched)
+        self._touched = None
+        # cantidad de accesos a memoria (para calcular la tasa de page faults)
+        self._references = 0
 
     @property
     def limit(self):
@@ -174,14 +315,163 @@ class MMU():
     @frameSize.setter
     def frameSize(self, frameSize):
         self._frameSize = frameSize
+        frames = self._memory.size // frameSize
+        self._referenced = bytearray(frames)
+        self._dirty = bytearray(frames)
+
+    @property
+    def references(self):
+        return self._references
+
+    @property
+    def tlbSize(self):
+        return self._tlbSize
+
+    @tlbSize.setter
+    def tlbSize(self, tlbSize):
+        self._tlbSize = tlbSize
+        while len(self._tlb) > tlbSize:
+            self._tlb.popitem(last=False)
+
+    @property
+    def tlbHits(self):
+        return self._tlbHits
+
+    @property
+    def tlbMisses(self):
+        return self._tlbMisses
+
+    @property
+    def tlbFlushes(self):
+        return self._tlbFlushes
+
+    def tlbHitRate(self):
+        lookups = self._tlbHits + self._tlbMisses
+        if lookups == 0:
+            return 0.0
+        return self._tlbHits / lookups
+
+    ## cantidad de direcciones que se pueden traducir sin misses (tlbSize paginas)
+    def tlbReach(self):
+        return self._tlbSize * self._frameSize
+
+    def isReferenced(self, frameId):
+        return self._referenced[frameId] == 1
+
+    def clearReferenced(self, frameId):
+        self._referenced[frameId] = 0
+
+    def isDirty(self, frameId):
+        return self._dirty[frameId] == 1
+
+    def clearDirty(self, frameId):
+        self._dirty[frameId] = 0
+
+    ## el frame se asigna a otra pagina: arranca sin referencias ni modificaciones
+    def resetFrameBits(self, frameId):
+        self._referenced[frameId] = 0
+        self._dirty[frameId] = 0
+
+    ## a partir de ahora se anotan los frames que se referencian (ver popTouched)
+    def trackTouched(self):
+        if self._touched is None:
+            self._touched = []
+
+    ## frames referenciados desde la llamada anterior (cada uno una vez por cada vez que se le
+    ## prendio el bit de referencia)
+    def popTouched(self):
+        touched = self._touched
+        self._touched = []
+        return touched
+
+    def _reference(self, frameId):
+        if not self._referenced[frameId]:
+            self._referenced[frameId] = 1
+            if self._touched is not None:
+                self._touched.append(frameId)
 
     def resetTLB(self):
-        self._tlb = dict()
+        self._tlbFlushes += 1
+        self._tlb.clear()
 
+    ## cambia de proceso: las traducciones de los demas quedan en la TLB
+    def switchAddressSpace(self, asid, pageTable):
+        self._asid = asid
+        self._pageTable = pageTable
+
+    ## cambia la traduccion de una pagina del espacio de direcciones actual
     def setPageFrame(self, pageId, frameId):
-        self._tlb[pageId] = frameId
+        self._pageTable[pageId] = frameId
+        self.invalidate(self._asid, pageId)
+
+    ## descarta la traduccion de la TLB (la pagina se cargo en otro frame o se desalojo)
+    def invalidate(self, asid, pageId):
+        self._tlb.pop((asid, pageId), None)
+
+    ## frame de la pagina: de la TLB, o recorriendo la page table si no esta (None si no esta cargada)
+    def _lookup(self, pageId):
+        key = (self._asid, pageId)
+        frameId = self._tlb.get(key)
+        if frameId is not None:
+            self._tlbHits += 1
+            self._tlb.move_to_end(key)
+            return frameId
+        self._tlbMisses += 1
+        frameId = self._pageTable[pageId]
+        if frameId is not None:
+            self._tlb[key] = frameId
+            if len(self._tlb) > self._tlbSize:
+                self._tlb.popitem(last=False)
+        return frameId
+
+    ## cantidad de instrucciones "instruction" consecutivas a partir de logicalAddress
+    ## que estan en paginas ya cargadas (es decir, que se pueden leer sin provocar page faults)
+    def residentRun(self, logicalAddress, instruction, maxCount = None):
+        count = 0
+        address = logicalAddress
+        while (maxCount is None or count < maxCount) and address <= self._limit:
+            pageId = address // self._frameSize
+            frameId = self._pageTable.get(pageId)
+            if frameId is None:
+                break
+            ## recorremos lo que queda de la pagina directamente en memoria
+            frameBaseDir = self._frameSize * frameId
+            for offset in range(address % self._frameSize, self._frameSize):
+                if (maxCount is not None and count >= maxCount) or address > self._limit:
+                    return count
+                if self._memory.read(frameBaseDir + offset) != instruction:
+                    return count
+                count += 1
+                address += 1
+        return count
+
+    ## marca como referenciadas las paginas de las "count" direcciones a partir de logicalAddress
+    ## (las que el CPU ejecuta de una sola vez al saltear ticks; tienen que estar cargadas).
+    ## La TLB queda igual que si se hubieran traducido de a una: un lookup por pagina y el resto hits
+    def touchRange(self, logicalAddress, count):
+        if count <= 0:
+            return
+        self._references += count
+        lastAddress = logicalAddress + count - 1
+        for pageId in range(logicalAddress // self._frameSize, lastAddress // self._frameSize + 1):
+            first = max(logicalAddress, pageId * self._frameSize)
+            last = min(lastAddress, (pageId + 1) * self._frameSize - 1)
+            self._reference(self._lookup(pageId))
+            self._tlbHits += last - first
 
     def fetch(self,  logicalAddress):
+        physicalAddress = self._translate(logicalAddress)
+        #
+        # obtenemos la instrucción alocada en esa direccion
+        return self._memory.read(physicalAddress)
+
+    ## escribe en una direccion logica (marca el frame como modificado)
+    def write(self, logicalAddress, value):
+        physicalAddress = self._translate(logicalAddress)
+        self._dirty[physicalAddress // self._frameSize] = 1
+        self._memory.write(physicalAddress, value)
+
+    def _translate(self, logicalAddress):
         if (logicalAddress > self._limit):
             raise Exception("Invalid Address,  {logicalAddress} is higher than process limit: {limit}".format(limit = self._limit, logicalAddress = logicalAddress))
         #
@@ -190,25 +480,22 @@ class MMU():
         offset = logicalAddress % self._frameSize
         #
         # buscamos la direccion Base del frame donde esta almacenada la pagina
-        frameId = self._tlb[pageId]
+        frameId = self._lookup(pageId)
         if frameId is None :
             pageFaultIRQ = IRQ(PAGE_FAULT_INTERRUPTION_TYPE, pageId)
-            HARDWARE.interruptVector.handle(pageFaultIRQ)
+            self._interruptVector.handle(pageFaultIRQ)
             # una vez resuelto el pageFault, volvemos a buscar en la Page Table
             # ya que la pagina, ahora debe estar cargada si o si
-            frameId = self._tlb[pageId]
-
+            frameId = self._lookup(pageId)
 
         ### setear los flags manejados por el MMU para los algoritmos de seleccion de victima
-
+        self._references += 1
+        self._reference(frameId)
 
         #
         ##calculamos la direccion fisica resultante
         frameBaseDir  = self._frameSize * frameId
-        physicalAddress = frameBaseDir + offset
-        #
-        # obtenemos la instrucción alocada en esa direccion
-        return self._memory.read(physicalAddress)
+        return frameBaseDir + offset
 
 
 ## emulates the main Central Processor Unit
@@ -220,6 +507,8 @@ class Cpu():
         self._pc = -1
         self._ir = None
         self._enable_stats = False
+        # cantidad de instrucciones ejecutadas desde que se encendio
+        self._executed = 0
 
 
     def tick(self, tickNbr):
@@ -234,16 +523,36 @@ class Cpu():
     def _fetch(self):
         self._ir = self._mmu.fetch(self._pc)
         self._pc += 1
+        self._executed += 1
 
     def _decode(self):
         ## decode no hace nada en este caso
         pass
 
-    def _stats(self):
+    ## ticks: cantidad de ciclos que representa la muestra (mas de uno si el clock salteo ciclos)
+    def _stats(self, ticks = 1):
         if self._enable_stats:
-            statsIRQ = IRQ(STAT_INTERRUPTION_TYPE)
+            statsIRQ = IRQ(STAT_INTERRUPTION_TYPE, ticks)
             self._interruptVector.handle(statsIRQ)
 
+    ## cantidad de ticks que el CPU puede ejecutar de corrido sin generar interrupciones:
+    ## una rafaga de instrucciones CPU sobre paginas cargadas (None si esta ocioso)
+    def ticksToEvent(self, maxTicks = None):
+        if not self.isBusy():
+            return None
+        return self._mmu.residentRun(self._pc, INSTRUCTION_CPU, maxTicks)
+
+    ## avanza "ticks" ciclos de una sola vez: si el CPU esta ocioso solo registra las estadisticas,
+    ## si esta ocupado retira la rafaga de instrucciones CPU completa (ver ticksToEvent)
+    def skipTicks(self, ticks):
+        self._stats(ticks)
+        if self.isBusy():
+            self._mmu.touchRange(self._pc, ticks)
+            self._ir = INSTRUCTION_CPU
+            self._pc += ticks
+            self._executed += ticks
+            log.logger.info("cpu - Exec burst: {ticks} x {instr}, PC={pc}".format(ticks=ticks, instr=self._ir, pc=self._pc))
+
     def _execute(self):
         if ASM.isEXIT(self._ir):
             killIRQ = IRQ(KILL_INTERRUPTION_TYPE)
@@ -265,6 +574,10 @@ class Cpu():
     def pc(self, addr):
         self._pc = addr
 
+    @property
+    def executed(self):
+        return self._executed
+
     @property
     def enable_stats(self):
         return self._enable_stats
@@ -279,15 +592,21 @@ class Cpu():
 ## emulates an Input/output device of the Hardware
 class AbstractIODevice():
 
-    def __init__(self, deviceId, deviceTime):
+    def __init__(self, deviceId, deviceTime, interruptVector):
         self._deviceId = deviceId
         self._deviceTime = deviceTime
+        self._interruptVector = interruptVector
         self._busy = False
 
     @property
     def deviceId(self):
         return self._deviceId
 
+    ## ticks de las operaciones que no dicen cuanto tardan
+    @property
+    def deviceTime(self):
+        return self._deviceTime
+
     @property
     def is_busy(self):
         return self._busy
@@ -304,22 +623,37 @@ class AbstractIODevice():
             self._busy = True
             self._ticksCount = 0
             self._operation = operation
+            ticks = ASM.ioTicks(operation)
+            self._operationTime = self._deviceTime if ticks is None else ticks
 
     def tick(self, tickNbr):
         if (self._busy):
             self._ticksCount += 1
-            if (self._ticksCount > self._deviceTime):
+            if (self._ticksCount > self._operationTime):
                 ## operation execution has finished
                 self._busy = False
                 ioOutIRQ = IRQ(IO_OUT_INTERRUPTION_TYPE, self._deviceId)
-                HARDWARE.interruptVector.handle(ioOutIRQ)
+                self._interruptVector.handle(ioOutIRQ)
             else:
-                log.logger.info("device {deviceId} - Busy: {ticksCount} of {deviceTime}".format(deviceId = self.deviceId, ticksCount = self._ticksCount, deviceTime = self._deviceTime))
+                log.logger.info("device {deviceId} - Busy: {ticksCount} of {deviceTime}".format(deviceId = self.deviceId, ticksCount = self._ticksCount, deviceTime = self._operationTime))
+
+    ## ticks que pueden pasar antes de que la operacion en curso termine
+    def ticksToEvent(self):
+        if not self._busy:
+            return None
+        return self._operationTime - self._ticksCount
+
+    def skipTicks(self, ticks):
+        if self._busy:
+            self._ticksCount += ticks
 
 
 class PrinterIODevice(AbstractIODevice):
-    def __init__(self):
-        super(PrinterIODevice, self).__init__("Printer", 3)
+
+    DEVICE_TIME = 3
+
+    def __init__(self, interruptVector):
+        super(PrinterIODevice, self).__init__("Printer", self.DEVICE_TIME, interruptVector)
 
 
 class Timer:
@@ -330,9 +664,20 @@ class Timer:
         self._tickCount = 0    # cantidad de de ciclos “ejecutados” por el proceso actual
         self._active = False    # por default esta desactivado
         self._quantum = 0   # por default esta desactivado
+        self._timeSlice = None  # quantum propio del proceso actual (None: usa el quantum global)
+
+    ## limite de ciclos del proceso actual: su time slice si tiene, sino el quantum global
+    ## (None si el timer esta desactivado)
+    def currentQuantum(self):
+        if self._timeSlice is not None:
+            return self._timeSlice
+        if self._active:
+            return self._quantum
+        return None
 
     def tick(self, tickNbr):
-        if self._active and (self._tickCount >= self._quantum) and self._cpu.isBusy():
+        quantum = self.currentQuantum()
+        if quantum is not None and (self._tickCount >= quantum) and self._cpu.isBusy():
             # se “cumplio” el limite de ejecuciones
             timeoutIRQ = IRQ(TIMEOUT_INTERRUPTION_TYPE)
             self._interruptVector.handle(timeoutIRQ)
@@ -344,6 +689,20 @@ class Timer:
     def reset(self):
            self._tickCount = 0
 
+    ## con el CPU ejecutando, el proximo evento es el fin del quantum o el fin de la rafaga de CPU
+    def ticksToEvent(self):
+        if not self._cpu.isBusy():
+            return None
+        maxTicks = None
+        quantum = self.currentQuantum()
+        if quantum is not None:
+            maxTicks = max(quantum - self._tickCount, 0)
+        return self._cpu.ticksToEvent(maxTicks)
+
+    def skipTicks(self, ticks):
+        self._tickCount += ticks
+        self._cpu.skipTicks(ticks)
+
     @property
     def quantum(self):
         return self._quantum
@@ -353,18 +712,35 @@ class Timer:
         self._active = True
         self._quantum = quantum
 
+    ## time slice del proceso que se carga en el CPU (lo setea el Dispatcher)
+    @property
+    def timeSlice(self):
+        return self._timeSlice
+
+    @timeSlice.setter
+    def timeSlice(self, timeSlice):
+        self._timeSlice = timeSlice
+
 
 ## emulates the Hardware that were the Operative System run
+## Cada instancia es una maquina independiente (sin estado global compartido):
+## se pueden correr varias a la vez en el mismo interprete
 class Hardware():
 
     ## Setup our hardware
-    def setup(self, memorySize):
+    ## virtualTime = True: el clock no espera entre ticks (ver Clock.run_for / Clock.run_until)
+    ## eventDriven = True: el clock saltea los ticks sin eventos (ver DiscreteEventClock)
+    ## tlbSize: entradas de la TLB del MMU
+    def setup(self, memorySize, virtualTime = False, eventDriven = False, tlbSize = 64):
         ## add the components to the "motherboard"
         self._memory = Memory(memorySize)
         self._interruptVector = InterruptVector()
-        self._clock = Clock()
-        self._ioDevice = PrinterIODevice()
-        self._mmu = MMU(self._memory)
+        if eventDriven:
+            self._clock = DiscreteEventClock()
+        else:
+            self._clock = Clock(virtualTime)
+        self._ioDevice = PrinterIODevice(self._interruptVector)
+        self._mmu = MMU(self._memory, self._interruptVector, tlbSize)
         self._cpu = Cpu(self._mmu, self._interruptVector)
         self._timer = Timer(self._cpu, self._interruptVector)
         self._clock.addSubscriber(self._ioDevice)
@@ -409,7 +785,3 @@ class Hardware():
     def __repr__(self):
         return "HARDWARE state {cpu}\n{mem}".format(cpu=self._cpu, mem=self._memory)
 
-### HARDWARE is a global variable
-### can be access from any
-HARDWARE = Hardware()
-
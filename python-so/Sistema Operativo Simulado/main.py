@@ -1,7 +1,6 @@
 from hardware import *
 from so import *
 import log
-from time import sleep
 
 
 ##
@@ -11,12 +10,11 @@ if __name__ == '__main__':
     log.setupLogger()
     log.logger.info('Starting emulator')
 
-    HARDWARE.setup(8)
+    ## tiempo virtual: los ticks corren uno detras de otro (sin sleep) y la salida es deterministica
+    hardware = Hardware()
+    hardware.setup(8, virtualTime = True)
 
-    HARDWARE.cpu.enable_stats = True
-
-    ## Switch on computer
-    HARDWARE.switchOn()
+    hardware.cpu.enable_stats = True
 
     #Setea scheduler que se va a usar en el test
     #scheduler = FCFSScheduler()
@@ -25,10 +23,7 @@ if __name__ == '__main__':
 
     ## new create the Operative System Kernel
     # "booteamos" el sistema operativo
-    kernel = Kernel(scheduler)
-
-    # Espera medio segundo para que todos los programas empiecen en el mismo tick a la vez
-    sleep(0.5)
+    kernel = Kernel(scheduler, hardware)
 
     # Ahora vamos a intentar ejecutar 3 programas a la vez
     ##################
@@ -66,19 +61,19 @@ if __name__ == '__main__':
     kernel.run("c:/prg5.exe", 4)
     kernel.run("c:/prg6.exe", 4)
     
-    # Si se corren estos programas entonces va a lanzar memory error porque ya no quedan frames libres
+    # Con estos programas tambien, ya no quedan frames libres y el MemoryManager tiene que desalojar paginas
     # kernel.run("c:/prg6.exe", 3)
     # kernel.run("c:/prg6.exe", 2)
     # kernel.run("c:/prg6.exe", 1)
 
 
 
-    # esperamos 60 segundos a que todos los procesos terminen
-    sleep(60)
-
-    HARDWARE.switchOff()
-
-    kernel.gantt.print_gantt()
+    # corremos el clock hasta que todos los procesos terminen; si la simulacion falla,
+    # igual se muestra el diagrama hasta el tick en que fallo
+    try:
+        kernel.run_until_idle()
+    finally:
+        kernel.gantt.print_gantt()
 
 
 
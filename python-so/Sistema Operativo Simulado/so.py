@@ -1,5 +1,9 @@
 #!/usr/bin/env python
+import heapq
 import math
+import random
+import sys
+from collections import deque, namedtuple
 from enum import Enum
 try:                                 #
     from hardware import *           #
@@ -10,6 +14,11 @@ try:                                 #
 except ImportError:                  #
     from . import log                ## import log
 
+try:
+    import numpy as np  # optional: ColumnarGanttChart
+except ImportError:
+    np = None
+
 
 
 ## emulates a compiled program
@@ -103,10 +112,15 @@ class KillInterruptionHandler(AbstractInterruptionHandler):
         pcb.state = PCBState.TERMINATED
 
         # CPU queda idle
-        HARDWARE.cpu.pc = -1
+        self.kernel.getDispatcher().save(pcb)
 
         self.kernel.memoryManager.freeFrames(pcb.pageTable.values())
 
+        # Lo saca de la tabla de procesos y guarda su registro en el archivo
+        pcb.completionTick = self.kernel.hardware.clock.currentTick
+        self.kernel.terminated(pcb)
+        self.kernel.reap(pcb)
+
         # Si hay alguien en la ready queue, despacharlo
         self.kernel.executeNext()
 
@@ -120,6 +134,8 @@ class IoInInterruptionHandler(AbstractInterruptionHandler):
 
         # Cambia su estado a Waiting y lo manda correr en el ioDevice
         pcb.state = PCBState.WAITING
+        pcb.countIO()
+        self.kernel.ioStarted(pcb)
         self.kernel.ioDeviceController.runOperation(pcb, irq.parameters)
 
         # Si hay alguien en la ready queue, despacharlo
@@ -130,6 +146,7 @@ class IoOutInterruptionHandler(AbstractInterruptionHandler):
 
     def execute(self, irq):
         pcb = self.kernel.ioDeviceController.getFinishedPCB()
+        self.kernel.ioCompleted(pcb)
         self.kernel.executeIf(pcb)
 
 
@@ -140,6 +157,18 @@ class NewInterruptionHandler(AbstractInterruptionHandler):
         priority = irq.parameters['priority']
         pageTable = self._kernel.load_program(path)
         pcb = PCB(path, self._kernel.getNewPID(), priority, pageTable)
+        pcb.arrivalTick = self._kernel.hardware.clock.currentTick
+
+        # tiempo real: el deadline es relativo a la llegada (si solo hay periodo, vence con el periodo)
+        period = irq.parameters.get('period')
+        deadline = irq.parameters.get('deadline')
+        if deadline is None:
+            deadline = period
+        pcb.period = period
+        if deadline is not None:
+            pcb.deadline = pcb.arrivalTick + deadline
+            self._kernel.gantt.setDeadline(pcb.pid, pcb.deadline)
+
         self._kernel.addToPCBTable(pcb)
         self._kernel.executeIf(pcb)
 
@@ -169,35 +198,384 @@ class PageFaultIntHandler(AbstractInterruptionHandler):
         self.kernel.loader.loadPage(pcb, pageId)
 
 
+## flags de cada frame en la tabla invertida (los bits que mantiene el MMU)
+FRAME_REFERENCED = 1
+FRAME_DIRTY = 2
+
+
+## Administra los frames de memoria:
+##   - un bitmap (bytearray, 1 = ocupado) dice en O(1) si un frame esta libre
+##   - los frames libres estan en una pila: asignar y liberar son O(1)
+##   - una tabla de paginas invertida (frame -> pcb duenio, pagina, flags): al desalojar un frame
+##     se invalida en O(1) la pagina en la tabla de su duenio y su traduccion en la TLB
+##   - cuando no hay frames libres, la victima la elige la politica de reemplazo
+##     (por default FIFOReplacement, ver las politicas mas abajo)
 class MemoryManager():
 
-    def __init__(self):
-        memSize = HARDWARE.memory.size 
-        #Tal vez deberia ser limit pero el mmu esta hardcodeado a 999 por lo que hace mal la division de frames con ese atributo
-        frameSize = HARDWARE.mmu.frameSize
-        self._freeFrameList = list(range(0, math.floor(memSize / frameSize)))
-        self._allocatedFrames = list()
+    def __init__(self, hardware, policy = None):
+        self._hardware = hardware
+        memSize = hardware.memory.size 
+        frameSize = hardware.mmu.frameSize
+        self._frameCount = math.floor(memSize / frameSize)
+        self._used = bytearray(self._frameCount)
+        # el proximo frame a asignar esta al final (se empieza por el frame 0)
+        self._freeFrameList = list(range(self._frameCount - 1, -1, -1))
+        self._faults = 0
+        self._evictions = 0
+        self._writeBacks = 0
+        # tabla invertida: pcb duenio y pagina que contiene cada frame (los flags estan en el MMU)
+        self._owners = [None] * self._frameCount
+        self._pages = [None] * self._frameCount
+        self._policy = policy if policy is not None else FIFOReplacement()
+        self._policy.setup(self)
+
+    @property
+    def hardware(self):
+        return self._hardware
+
+    @property
+    def policy(self):
+        return self._policy
+
+    @property
+    def frameCount(self):
+        return self._frameCount
+
+    @property
+    def freeCount(self):
+        return len(self._freeFrameList)
+
+    @property
+    def allocatedCount(self):
+        return self._frameCount - len(self._freeFrameList)
+
+    ## fraccion de frames ocupados
+    @property
+    def occupancy(self):
+        if self._frameCount == 0:
+            return 0.0
+        return self.allocatedCount / self._frameCount
+
+    ## cantidad de page faults (frames pedidos)
+    @property
+    def faults(self):
+        return self._faults
+
+    ## cantidad de veces que hubo que desalojar un frame ocupado (no habia libres)
+    @property
+    def evictions(self):
+        return self._evictions
 
-    def allocFrame(self):
+    ## paginas modificadas que hubo que escribir antes de reusar su frame
+    @property
+    def writeBacks(self):
+        return self._writeBacks
+
+    def countWriteBack(self):
+        self._writeBacks += 1
+
+    ## page faults por cada acceso a memoria
+    def faultRate(self):
+        references = self._hardware.mmu.references
+        if references == 0:
+            return 0.0
+        return self._faults / references
+
+    def isFree(self, frame):
+        return not self._used[frame]
+
+    ## (pcb, pagina, flags) del frame, o None si esta libre
+    def frameEntry(self, frame):
+        if not self._used[frame]:
+            return None
+        mmu = self._hardware.mmu
+        flags = 0
+        if mmu.isReferenced(frame):
+            flags |= FRAME_REFERENCED
+        if mmu.isDirty(frame):
+            flags |= FRAME_DIRTY
+        return self._owners[frame], self._pages[frame], flags
+
+    ## el tramo mas largo de frames libres contiguos
+    def largestFreeRun(self):
+        return max(len(run) for run in self._used.split(b'\x01'))
+
+    ## que tan dispersos estan los frames libres: 0 si forman un solo tramo contiguo,
+    ## tiende a 1 cuanto mas partidos estan (no afecta la paginacion, pero si a bloques contiguos)
+    def fragmentation(self):
+        if not self._freeFrameList:
+            return 0.0
+        return 1 - self.largestFreeRun() / len(self._freeFrameList)
+
+    ## frame para la pagina "pageId" de "pcb"
+    def allocFrame(self, pcb, pageId):
+        self._faults += 1
+        self._policy.faultPing()
 
         # Si hay frame libre se la devuelve
         if self._freeFrameList:
-            freeFrame = self._freeFrameList.pop(0)
-            self._allocatedFrames.append(freeFrame)
-            return freeFrame
-
-        # Sino hace SWAP
-        return self.selectVictim()
+            frame = self._freeFrameList.pop()
+            self._used[frame] = 1
+        else:
+            # Sino hace SWAP
+            frame = self.selectVictim()
+            self._evict(frame)
+
+        self._owners[frame] = pcb
+        self._pages[frame] = pageId
+        self._hardware.mmu.resetFrameBits(frame)
+        self._policy.frameLoaded(frame)
+        return frame
+
+    ## la pagina que estaba en el frame deja de estar cargada para su duenio
+    def _evict(self, frame):
+        self._evictions += 1
+        if self._hardware.mmu.isDirty(frame):
+            self._writeBacks += 1
+        owner = self._owners[frame]
+        if owner is None:
+            return
+        page = self._pages[frame]
+        owner.pageTable[page] = None
+        self._hardware.mmu.invalidate(owner.pid, page)
 
     def selectVictim(self):
-        freeFrame = self._allocatedFrames.pop(0) # Se elige al primero
-        self._allocatedFrames.append(freeFrame) # y se lo encola al final porque fue el ultimo marco en ingresar
-        return freeFrame # FIFO
-                        # TODO fijarse de implementar algun otro
+        return self._policy.selectVictim()
 
     def freeFrames(self, frames):
         for frame in frames:
+            # las paginas que nunca se cargaron no tienen frame
+            if frame is None or not self._used[frame]:
+                continue
+            self._used[frame] = 0
+            self._hardware.mmu.invalidate(self._owners[frame].pid, self._pages[frame])
+            self._owners[frame] = None
+            self._pages[frame] = None
             self._freeFrameList.append(frame)
+            self._policy.frameFreed(frame)
+
+
+##
+##  Politicas de reemplazo de paginas: eligen que frame desalojar cuando no quedan libres.
+##  Las que aproximan LRU usan los bits de referencia / modificacion que prende el MMU
+##
+class AbstractReplacementPolicy():
+
+    def setup(self, memoryManager):
+        self._memoryManager = memoryManager
+        self._mmu = memoryManager.hardware.mmu
+        self._frameCount = memoryManager.frameCount
+
+    ## hubo un page fault (antes de pedir el frame)
+    def faultPing(self):
+        pass
+
+    ## se cargo una pagina en el frame
+    def frameLoaded(self, frame):
+        pass
+
+    ## el frame quedo libre
+    def frameFreed(self, frame):
+        pass
+
+    def selectVictim(self):
+        log.logger.error("-- SELECTVICTIM MUST BE OVERRIDEN in class {classname}".format(classname=self.__class__.__name__))
+
+
+## FIFO: se desaloja la pagina que hace mas tiempo que esta cargada. Los frames estan en una cola
+## en orden de carga; liberar no los saca de la cola: las entradas viejas (frame liberado o
+## recargado) se descartan al llegar al frente, y la cola se compacta si hay mas viejas que vigentes
+class FIFOReplacement(AbstractReplacementPolicy):
+
+    def setup(self, memoryManager):
+        super().setup(memoryManager)
+        # (frame, carga) en orden de carga; "carga" distingue una entrada vieja de la vigente
+        self._loadedFrames = deque()
+        self._loads = [0] * self._frameCount
+
+    def frameLoaded(self, frame):
+        self._loads[frame] += 1
+        self._loadedFrames.append((frame, self._loads[frame]))
+
+    def frameFreed(self, frame):
+        if len(self._loadedFrames) > 2 * self._memoryManager.allocatedCount + 64:
+            self._loadedFrames = deque(entry for entry in self._loadedFrames if self._isCurrent(entry))
+
+    def _isCurrent(self, entry):
+        frame, load = entry
+        return not self._memoryManager.isFree(frame) and load == self._loads[frame]
+
+    def selectVictim(self):
+        while True:
+            entry = self._loadedFrames.popleft() # Se elige al primero
+            if self._isCurrent(entry):
+                return entry[0]
+
+
+## Clock (segunda oportunidad): una aguja recorre los frames en circulo; si la pagina fue
+## referenciada le borra el bit y sigue, si no, es la victima.
+## Cada frame que la aguja saltea consume un bit de referencia: O(1) amortizado por referencia
+class ClockReplacement(AbstractReplacementPolicy):
+
+    def setup(self, memoryManager):
+        super().setup(memoryManager)
+        self._hand = 0
+
+    def _advance(self):
+        frame = self._hand
+        self._hand = (self._hand + 1) % self._frameCount
+        return frame
+
+    def selectVictim(self):
+        while True:
+            frame = self._advance()
+            if self._memoryManager.isFree(frame):
+                continue
+            if self._mmu.isReferenced(frame):
+                self._mmu.clearReferenced(frame)
+                continue
+            return frame
+
+
+## Clock mejorado: ademas del bit de referencia mira el de modificacion, y prefiere desalojar
+## paginas limpias. Una pagina no referenciada pero modificada no se desaloja: se escribe
+## (se limpia su bit de modificacion) y la aguja sigue. Cada salto consume un bit de referencia
+## o de modificacion: O(1) amortizado
+class EnhancedClockReplacement(ClockReplacement):
+
+    def selectVictim(self):
+        while True:
+            frame = self._advance()
+            if self._memoryManager.isFree(frame):
+                continue
+            if self._mmu.isReferenced(frame):
+                self._mmu.clearReferenced(frame)
+                continue
+            if self._mmu.isDirty(frame):
+                self._mmu.clearDirty(frame)
+                self._memoryManager.countWriteBack()
+                continue
+            return frame
+
+
+## Aging: cada frame tiene un contador de "bits" bits; en cada page fault los contadores se
+## desplazan a la derecha y los frames referenciados desde el fault anterior prenden el bit mas alto.
+## Se desaloja el de menor contador (el menos usado recientemente).
+## En vez de desplazar todos los contadores, cada frame guarda las epocas (page faults) de sus
+## ultimas "bits" referencias: comparar esas tuplas da el mismo orden que los contadores (y desempata
+## los iguales por las referencias mas viejas). Un heap ordena los frames por esas tuplas y solo se
+## actualizan los frames referenciados (los que anota el MMU): O(log n) amortizado por referencia
+class AgingReplacement(AbstractReplacementPolicy):
+
+    def __init__(self, bits = 8):
+        self._bits = bits
+
+    def setup(self, memoryManager):
+        super().setup(memoryManager)
+        self._mmu.trackTouched()
+        self._epoch = 0
+        self._history = [()] * self._frameCount
+        # heap de (historia, version, frame); "version" descarta las entradas viejas
+        self._heap = []
+        self._versions = [0] * self._frameCount
+
+    def _referenced(self, frame):
+        history = self._history[frame]
+        if history and history[0] == self._epoch:
+            return
+        self._history[frame] = ((self._epoch,) + history)[:self._bits]
+        self._push(frame)
+
+    def _push(self, frame):
+        self._versions[frame] += 1
+        heapq.heappush(self._heap, (self._history[frame], self._versions[frame], frame))
+        if len(self._heap) > 2 * self._frameCount + 64:
+            self._heap = [entry for entry in self._heap if self._isCurrent(entry)]
+            heapq.heapify(self._heap)
+
+    def _isCurrent(self, entry):
+        _, version, frame = entry
+        return not self._memoryManager.isFree(frame) and version == self._versions[frame]
+
+    def faultPing(self):
+        for frame in self._mmu.popTouched():
+            if not self._memoryManager.isFree(frame) and self._mmu.isReferenced(frame):
+                self._mmu.clearReferenced(frame)
+                self._referenced(frame)
+        self._epoch += 1
+
+    def frameLoaded(self, frame):
+        self._history[frame] = ()
+        self._referenced(frame)
+
+    def frameFreed(self, frame):
+        self._versions[frame] += 1
+
+    def selectVictim(self):
+        while True:
+            entry = heapq.heappop(self._heap)
+            if self._isCurrent(entry):
+                return entry[2]
+
+
+## Not Recently Used: los frames se agrupan en 4 clases segun (referenciado, modificado) y se desaloja
+## uno de la clase mas baja (0: ni referenciado ni modificado ... 3: las dos cosas).
+## Cada "resetPeriod" page faults se borran los bits de referencia.
+## Las clases son diccionarios (ordenados por insercion): mover un frame de clase y elegir la
+## victima son O(1); los frames que cambian de clase son los que anota el MMU al referenciarlos
+class NRUReplacement(AbstractReplacementPolicy):
+
+    def __init__(self, resetPeriod = 8):
+        self._resetPeriod = resetPeriod
+
+    def setup(self, memoryManager):
+        super().setup(memoryManager)
+        self._mmu.trackTouched()
+        self._classes = [dict() for _ in range(4)]
+        self._classOf = [None] * self._frameCount
+        self._faults = 0
+
+    def _classify(self, frame):
+        frameClass = 0
+        if self._mmu.isReferenced(frame):
+            frameClass += 2
+        if self._mmu.isDirty(frame):
+            frameClass += 1
+        return frameClass
+
+    def _move(self, frame, frameClass):
+        current = self._classOf[frame]
+        if current is not None:
+            del self._classes[current][frame]
+        self._classes[frameClass][frame] = None
+        self._classOf[frame] = frameClass
+
+    def faultPing(self):
+        for frame in self._mmu.popTouched():
+            if not self._memoryManager.isFree(frame):
+                self._move(frame, self._classify(frame))
+        self._faults += 1
+        if self._faults % self._resetPeriod == 0:
+            for frameClass in (2, 3):
+                for frame in list(self._classes[frameClass]):
+                    self._mmu.clearReferenced(frame)
+                    self._move(frame, self._classify(frame))
+
+    def frameLoaded(self, frame):
+        # la pagina recien cargada se va a usar enseguida: cuenta como referenciada
+        self._move(frame, 2)
+
+    def frameFreed(self, frame):
+        del self._classes[self._classOf[frame]][frame]
+        self._classOf[frame] = None
+
+    def selectVictim(self):
+        for frameClass in self._classes:
+            if frameClass:
+                frame = next(iter(frameClass))
+                del frameClass[frame]
+                self._classOf[frame] = None
+                return frame
 
 
 class FileSystem():
@@ -215,43 +593,55 @@ class FileSystem():
         
         return program
 
+    def delete(self, path):
+        if self._path.pop(path, None) is None:
+            raise ValueError("No se encuentra un programa en el path indicado")
+
 # emulates the core of an Operative System
 class Kernel():
 
-    def __init__(self, scheduler):
-        HARDWARE.mmu.frameSize = 4
+    ## ganttChart: por default un GanttChart, se puede pasar otro (ej: ColumnarGanttChart)
+    ## replacementPolicy: politica de reemplazo de paginas (por default FIFOReplacement)
+    def __init__(self, scheduler, hardware, ganttChart = None, replacementPolicy = None):
+        self._hardware = hardware
+        hardware.mmu.frameSize = 4
         self._pcbTable = PCBTable()
         self._scheduler = scheduler
-        self._dispatcher = Dispatcher()
-        self._ganttChart = GanttChart()
-        self._memoryManager = MemoryManager()
+        self._dispatcher = Dispatcher(hardware)
+        self._ganttChart = ganttChart if ganttChart is not None else GanttChart()
+        self._memoryManager = MemoryManager(hardware, replacementPolicy)
         self._fileSystem = FileSystem()
-        self._loader = Loader(self._fileSystem, self._memoryManager)
+        self._loader = Loader(self._fileSystem, self._memoryManager, hardware)
+        # a quienes avisarles cuando un proceso terminado sale de la tabla: listener(pcb)
+        self._reapListeners = []
 
         ## setup interruption handlers
         killHandler = KillInterruptionHandler(self)
-        HARDWARE.interruptVector.register(KILL_INTERRUPTION_TYPE, killHandler)
+        hardware.interruptVector.register(KILL_INTERRUPTION_TYPE, killHandler)
 
         ioInHandler = IoInInterruptionHandler(self)
-        HARDWARE.interruptVector.register(IO_IN_INTERRUPTION_TYPE, ioInHandler)
+        hardware.interruptVector.register(IO_IN_INTERRUPTION_TYPE, ioInHandler)
 
         ioOutHandler = IoOutInterruptionHandler(self)
-        HARDWARE.interruptVector.register(IO_OUT_INTERRUPTION_TYPE, ioOutHandler)
+        hardware.interruptVector.register(IO_OUT_INTERRUPTION_TYPE, ioOutHandler)
 
         newHandler = NewInterruptionHandler(self)
-        HARDWARE.interruptVector.register(NEW_INTERRUPTION_TYPE, newHandler)
+        hardware.interruptVector.register(NEW_INTERRUPTION_TYPE, newHandler)
 
         timeoutHandler = TimeoutInterruptionHandler(self)
-        HARDWARE.interruptVector.register(TIMEOUT_INTERRUPTION_TYPE, timeoutHandler)
+        hardware.interruptVector.register(TIMEOUT_INTERRUPTION_TYPE, timeoutHandler)
 
         statHandler = StatInterruptionHandler(self)
-        HARDWARE.interruptVector.register(STAT_INTERRUPTION_TYPE, statHandler)
+        hardware.interruptVector.register(STAT_INTERRUPTION_TYPE, statHandler)
 
         pageFaultHandler = PageFaultIntHandler(self)
-        HARDWARE.interruptVector.register(PAGE_FAULT_INTERRUPTION_TYPE, pageFaultHandler)
+        hardware.interruptVector.register(PAGE_FAULT_INTERRUPTION_TYPE, pageFaultHandler)
 
         ## controls the Hardware's I/O Device
-        self._ioDeviceController = IoDeviceController(HARDWARE.ioDevice)
+        self._ioDeviceController = IoDeviceController(hardware.ioDevice)
+
+        ## el scheduler configura el hardware que necesite (ej: el quantum del timer)
+        self._scheduler.setup(self)
 
     def getNewPID(self):
         return self._pcbTable.getNewPID() 
@@ -259,6 +649,30 @@ class Kernel():
     def addToPCBTable(self, pcb):
         return self._pcbTable.add(pcb)
 
+    ## saca un proceso TERMINATED de la tabla y guarda su registro en el archivo
+    def reap(self, pcb):
+        # con las estadisticas activas su estado final queda pendiente para la proxima muestra;
+        # sin estadisticas no queda ninguna referencia al pcb en la tabla
+        sampling = self._hardware.cpu.enable_stats
+        if not sampling:
+            self._pcbTable.dropReapedSamples()
+        record = self._pcbTable.archive(pcb.pid, sampling)
+        for listener in self._reapListeners:
+            listener(pcb)
+        return record
+
+    def addReapListener(self, listener):
+        self._reapListeners.append(listener)
+
+    ## registros (PCBRecord) de los procesos que ya terminaron
+    @property
+    def archive(self):
+        return self._pcbTable.archived
+
+    @property
+    def hardware(self):
+        return self._hardware
+
     @property
     def ioDeviceController(self):
         return self._ioDeviceController
@@ -276,7 +690,7 @@ class Kernel():
         return self._memoryManager
 
     def executeIf(self, pcb):
-        if not HARDWARE.cpu.isBusy():
+        if not self._hardware.cpu.isBusy():
             self.execute(pcb)
         elif self._scheduler.mustExpropiate(pcb, self._pcbTable.runningPcb):
             self._dispatcher.save(self._pcbTable.runningPcb)
@@ -293,6 +707,7 @@ class Kernel():
         self._scheduler.add(pcb)        
 
     def execute(self, pcb):
+        pcb.timeSlice = self._scheduler.timeSlice(pcb)
         self._dispatcher.load(pcb)
         pcb.state = PCBState.RUNNING
         self._pcbTable.runningPcb = pcb
@@ -308,10 +723,22 @@ class Kernel():
         return self._pcbTable
             
     ## emulates a "system call" for programs execution
-    def run(self, path, priority):
-        parameters = {'path': path, 'priority': priority}
+    ## deadline: ticks desde la llegada en los que el proceso tiene que terminar (opcional)
+    ## period: periodo del proceso, para rate-monotonic (opcional, si no hay deadline vence con el periodo)
+    def run(self, path, priority, deadline = None, period = None):
+        parameters = {'path': path, 'priority': priority, 'deadline': deadline, 'period': period}
         newIRQ = IRQ(NEW_INTERRUPTION_TYPE, parameters)
-        HARDWARE.interruptVector.handle(newIRQ)
+        self._hardware.interruptVector.handle(newIRQ)
+
+    ## programa la ejecucion de un programa para que llegue en el tick indicado
+    def runAt(self, tick, path, priority, deadline = None, period = None):
+        self._hardware.clock.schedule(tick, lambda: self.run(path, priority, deadline, period))
+
+    ## tarea periodica: lanza "jobs" instancias del programa, una cada "period" ticks a partir de
+    ## "startTick"; cada instancia es un proceso con su propio deadline (por default, el periodo)
+    def runPeriodic(self, path, priority, period, jobs, startTick = 0, deadline = None):
+        for job in range(jobs):
+            self.runAt(startTick + job * period, path, priority, deadline, period)
 
     def load_program(self, path):
         return self._loader.load(path)
@@ -322,20 +749,45 @@ class Kernel():
         return self._pcbTable.runningPcb
 
     def executeNext(self):
-        if not self._scheduler.isEmpty() and HARDWARE.cpu.pc == -1:
+        if not self._scheduler.isEmpty() and self._hardware.cpu.pc == -1:
             nextPCB = self._scheduler.getNext()
             self.execute(nextPCB)
-        elif HARDWARE.cpu.pc != -1:
+        elif self._hardware.cpu.pc != -1:
             log.logger.warning("No se puede despachar otro proceso si ya se está corriendo uno")
         else:
             log.logger.info("No hay procesos en la ready queue")
 
     def isEmpty(self):
         return self._scheduler.isEmpty()
+
+    ## el sistema esta ocioso cuando todos los procesos cargados terminaron
+    ## y no quedan llegadas programadas
+    def isIdle(self):
+        if self._hardware.clock.hasPendingEvents():
+            return False
+        return self._pcbTable.countInState(PCBState.TERMINATED) == len(self._pcbTable)
+
+    ## avanza el clock (en tiempo virtual) hasta que todos los procesos esten TERMINATED
+    ## devuelve la cantidad de ticks ejecutados
+    def run_until_idle(self, maxTicks = None):
+        ticks = self._hardware.clock.run_until(self.isIdle, maxTicks)
+        if self.isIdle():
+            ## un tick mas para que las estadisticas registren el estado final de los procesos
+            ticks += self._hardware.clock.run_for(1)
+        return ticks
     
     def timeoutPing(self, handler):
         self._scheduler.timeoutPing(handler)
 
+    def ioStarted(self, pcb):
+        self._scheduler.ioStarted(pcb)
+
+    def ioCompleted(self, pcb):
+        self._scheduler.ioCompleted(pcb)
+
+    def terminated(self, pcb):
+        self._scheduler.terminated(pcb)
+
     def __repr__(self):
         return "Kernel"
 
@@ -343,7 +795,11 @@ class Kernel():
 class AbstractScheduler():
 
     def __init__(self):
-        pass
+        self._kernel = None
+
+    ## lo llama el Kernel al crearse: a partir de aca el scheduler puede usar su hardware
+    def setup(self, kernel):
+        self._kernel = kernel
 
     def add(self, pcb):
         log.logger.error("-- ADD MUST BE OVERRIDEN in class {classname}".format(classname=self.__class__.__name__))
@@ -360,6 +816,29 @@ class AbstractScheduler():
     def mustExpropiate(self, pcb, runningPCB):
         return False
 
+    ## cuantos ciclos puede correr el proceso antes del timeout (lo aplica el Timer al cargarlo);
+    ## None para usar el quantum global del timer
+    def timeSlice(self, pcb):
+        return None
+
+    ## el proceso sigue en el CPU despues de un timeout: arranca un time slice nuevo
+    def _renewTimeSlice(self, pcb):
+        pcb.timeSlice = self.timeSlice(pcb)
+        self._kernel.hardware.timer.timeSlice = pcb.timeSlice
+        self._kernel.hardware.timer.reset()
+
+    ## el proceso dejo el CPU para hacer una operacion de I/O (fin de su rafaga de CPU)
+    def ioStarted(self, pcb):
+        pass
+
+    ## el proceso termino su operacion de I/O (antes de volver a la ready queue o al CPU)
+    def ioCompleted(self, pcb):
+        pass
+
+    ## el proceso termino (para liberar lo que el scheduler guarde de el)
+    def terminated(self, pcb):
+        pass
+
 
 
 class FCFSScheduler(AbstractScheduler):
@@ -387,7 +866,11 @@ class PrioritySchedulerNoExp(AbstractScheduler):
     def __init__(self, quantum):
         super().__init__()
         self._readyQueue = [[], [], [], [], []]
-        HARDWARE.timer.quantum = quantum
+        self._quantum = quantum
+
+    def setup(self, kernel):
+        super().setup(kernel)
+        kernel.hardware.timer.quantum = self._quantum
 
     def add(self, pcb):
         self._readyQueue[pcb.agedPriority].append(pcb)
@@ -414,7 +897,7 @@ class PrioritySchedulerNoExp(AbstractScheduler):
 
     def timeoutPing(self, handler):
         self._agePcbs()
-        HARDWARE.timer.reset()
+        self._kernel.hardware.timer.reset()
 
 class PrioritySchedulerExp(PrioritySchedulerNoExp):
 
@@ -424,16 +907,564 @@ class PrioritySchedulerExp(PrioritySchedulerNoExp):
     def timeoutPing(self, handler):
         self._agePcbs()
         handler.expropiateIfMust()
-        HARDWARE.timer.reset()
+        self._kernel.hardware.timer.reset()
 
 
 
-class RoundRobinScheduler(AbstractScheduler):
+## Misma politica que PrioritySchedulerNoExp, pero con un heap y envejecimiento "perezoso":
+## en vez de mover a todos los procesos de la ready queue en cada timeout, se cuenta la cantidad
+## de envejecimientos (epoch) y la prioridad de cada proceso se calcula recien al sacarlo:
+##     prioridad = max(prioridadAlEntrar - (epoch - epochAlEntrar), 0)
+## El orden de las listas originales (por prioridad y, dentro de cada una, por orden de llegada
+## a esa lista) queda fijo al entrar con la clave:
+##     (prioridadAlEntrar + epochAlEntrar, 1 si entro con prioridad 0 sino 0, orden de llegada)
+## add y getNext son O(log n) y envejecer es O(1)
+class LazyPrioritySchedulerNoExp(AbstractScheduler):
 
     def __init__(self, quantum):
         super().__init__()
         self._readyQueue = []
-        HARDWARE.timer.quantum = quantum
+        self._epoch = 0
+        self._seq = 0
+        self._quantum = quantum
+
+    def setup(self, kernel):
+        super().setup(kernel)
+        kernel.hardware.timer.quantum = self._quantum
+
+    def add(self, pcb):
+        priority = pcb.agedPriority
+        key = (priority + self._epoch, 1 if priority == 0 else 0, self._seq)
+        heapq.heappush(self._readyQueue, (key, pcb))
+        self._seq += 1
+
+    def getNext(self):
+        if self.isEmpty():
+            return None
+        key, pcb = heapq.heappop(self._readyQueue)
+        pcb.agedPriority = max(key[0] - self._epoch, 0)
+        return pcb
+
+    def isEmpty(self):
+        return not self._readyQueue
+
+    def _agePcbs(self):
+        self._epoch += 1
+
+    def timeoutPing(self, handler):
+        self._agePcbs()
+        self._kernel.hardware.timer.reset()
+
+class LazyPrioritySchedulerExp(LazyPrioritySchedulerNoExp):
+
+    def mustExpropiate(self, pcb, runningPCB):
+        return pcb.agedPriority < runningPCB.agedPriority
+
+    def timeoutPing(self, handler):
+        self._agePcbs()
+        handler.expropiateIfMust()
+        self._kernel.hardware.timer.reset()
+
+
+
+## Multi-level feedback queue: una cola por nivel, cada una con su propio quantum
+##   - un proceso nuevo entra en el nivel 0 (el de mayor prioridad y quantum mas corto)
+##   - si consume todo su quantum (timeout) baja un nivel
+##   - cuando termina una operacion de I/O sube un nivel
+##   - cada "boostPeriod" ticks todos los procesos vuelven al nivel 0 (evita la inanicion)
+## Un proceso de un nivel mas alto expropia al que esta corriendo en un nivel mas bajo
+class MLFQScheduler(AbstractScheduler):
+
+    def __init__(self, quanta = (2, 4, 8), boostPeriod = 50):
+        super().__init__()
+        self._quanta = list(quanta)
+        self._readyQueue = [deque() for _ in self._quanta]
+        self._size = 0
+        # pid -> nivel actual del proceso
+        self._levels = dict()
+        self._boostPeriod = boostPeriod
+        self._lastBoost = 0
+
+    def levelOf(self, pcb):
+        return self._levels.get(pcb.pid, 0)
+
+    def _setLevel(self, pcb, level):
+        self._levels[pcb.pid] = min(max(level, 0), len(self._quanta) - 1)
+
+    def add(self, pcb):
+        self._boostIfMust()
+        self._readyQueue[self.levelOf(pcb)].append(pcb)
+        self._size += 1
+
+    def getNext(self):
+        self._boostIfMust()
+        for queue in self._readyQueue:
+            if queue:
+                self._size -= 1
+                return queue.popleft()
+        return None
+
+    def isEmpty(self):
+        return self._size == 0
+
+    def mustExpropiate(self, pcb, runningPCB):
+        return self.levelOf(pcb) < self.levelOf(runningPCB)
+
+    def timeSlice(self, pcb):
+        return self._quanta[self.levelOf(pcb)]
+
+    def timeoutPing(self, handler):
+        pcb = self._kernel.getRunningPCB()
+        self._setLevel(pcb, self.levelOf(pcb) + 1)
+        self._boostIfMust()
+        if self._kernel.isEmpty():
+            # sigue corriendo el mismo proceso, con el quantum de su nuevo nivel
+            self._renewTimeSlice(pcb)
+        else:
+            handler.timeoutSwitch()
+
+    def ioCompleted(self, pcb):
+        self._setLevel(pcb, self.levelOf(pcb) - 1)
+
+    def terminated(self, pcb):
+        self._levels.pop(pcb.pid, None)
+
+    def _boostIfMust(self):
+        tick = self._kernel.hardware.clock.currentTick
+        if tick - self._lastBoost < self._boostPeriod:
+            return
+        self._lastBoost = tick
+        self._levels = dict()
+        # todos al nivel 0, respetando el orden entre niveles
+        boosted = deque()
+        for queue in self._readyQueue:
+            boosted.extend(queue)
+            queue.clear()
+        self._readyQueue[0] = boosted
+
+
+
+## Completely Fair Scheduler: cada proceso acumula un "tiempo virtual" (vruntime) que avanza
+## mas lento cuanto mayor es su peso (que sale de su prioridad), y siempre corre el de menor vruntime.
+##   - la ready queue es un heap por vruntime: elegir el siguiente es O(log n)
+##   - el tiempo de CPU se cobra a partir de pcb.cpuTicks, que actualiza Dispatcher.save
+##   - el quantum de cada proceso es su parte (segun su peso) de "targetLatency" entre
+##     todos los procesos listos, y nunca menos de "minGranularity"
+##   - los procesos nuevos o que vuelven de I/O se ubican cerca del menor vruntime, para que
+##     no acaparen el CPU ni queden al fondo de la cola
+class CFSScheduler(AbstractScheduler):
+
+    NICE_0_WEIGHT = 1024
+    # pesos por prioridad (0 es la mas alta), los mismos que usa Linux para nice -2 a 2
+    WEIGHTS = [1586, 1277, 1024, 820, 655]
+
+    def __init__(self, targetLatency = 12, minGranularity = 2, wakeupGranularity = 1):
+        super().__init__()
+        self._readyQueue = []
+        self._seq = 0
+        self._targetLatency = targetLatency
+        self._minGranularity = minGranularity
+        self._wakeupGranularity = wakeupGranularity
+        # pid -> vruntime y pid -> cpuTicks ya cobrados en el vruntime
+        self._vruntime = dict()
+        self._charged = dict()
+        self._minVruntime = 0.0
+        self._readyWeight = 0
+
+    def weightOf(self, pcb):
+        return self.WEIGHTS[min(max(pcb.priority, 0), len(self.WEIGHTS) - 1)]
+
+    def vruntimeOf(self, pcb):
+        return self._vruntime.get(pcb.pid, self._minVruntime)
+
+    ## vruntime del proceso que esta corriendo, contando lo que lleva corrido desde que se cargo
+    def _currentVruntime(self, runningPCB):
+        ran = self._kernel.getDispatcher().runningTicks()
+        return self.vruntimeOf(runningPCB) + ran * self.NICE_0_WEIGHT / self.weightOf(runningPCB)
+
+    ## cobra el CPU usado desde la ultima vez y ubica al proceso respecto del menor vruntime
+    def _place(self, pcb):
+        vruntime = self.vruntimeOf(pcb)
+        ran = pcb.cpuTicks - self._charged.get(pcb.pid, 0)
+        vruntime += ran * self.NICE_0_WEIGHT / self.weightOf(pcb)
+        self._charged[pcb.pid] = pcb.cpuTicks
+        self._vruntime[pcb.pid] = max(vruntime, self._minVruntime - self._targetLatency / 2)
+        return self._vruntime[pcb.pid]
+
+    def _updateMinVruntime(self):
+        if self._readyQueue:
+            self._minVruntime = max(self._minVruntime, self._readyQueue[0][0])
+
+    def add(self, pcb):
+        vruntime = self._place(pcb)
+        heapq.heappush(self._readyQueue, (vruntime, self._seq, pcb))
+        self._seq += 1
+        self._readyWeight += self.weightOf(pcb)
+
+    def getNext(self):
+        if self.isEmpty():
+            return None
+        self._updateMinVruntime()
+        _, _, pcb = heapq.heappop(self._readyQueue)
+        self._readyWeight -= self.weightOf(pcb)
+        return pcb
+
+    def isEmpty(self):
+        return not self._readyQueue
+
+    ## quantum: la parte de targetLatency que le toca segun su peso entre los procesos listos
+    def timeSlice(self, pcb):
+        weight = self.weightOf(pcb)
+        timeSlice = round(self._targetLatency * weight / (self._readyWeight + weight))
+        return max(timeSlice, self._minGranularity)
+
+    def mustExpropiate(self, pcb, runningPCB):
+        return self._place(pcb) + self._wakeupGranularity < self._currentVruntime(runningPCB)
+
+    def timeoutPing(self, handler):
+        runningPCB = self._kernel.getRunningPCB()
+        if self.isEmpty() or self._readyQueue[0][0] >= self._currentVruntime(runningPCB):
+            # sigue siendo el mas atrasado: sigue corriendo con un nuevo quantum
+            self._renewTimeSlice(runningPCB)
+        else:
+            handler.timeoutSwitch()
+
+    def terminated(self, pcb):
+        self._vruntime.pop(pcb.pid, None)
+        self._charged.pop(pcb.pid, None)
+
+
+
+## Shortest Job First (no expropiativo): corre primero el proceso con la proxima rafaga de CPU
+## mas corta. La rafaga se estima de dos formas:
+##   - PREDICT_PROGRAM: mirando el programa, la distancia desde pcb.pc hasta la proxima
+##     instruccion de I/O o EXIT (se calcula una vez por programa)
+##   - PREDICT_AVERAGE: promedio exponencial de las rafagas observadas
+##     estimacion = alpha * ultimaRafaga + (1 - alpha) * estimacionAnterior
+## En los dos casos se descuenta lo que el proceso ya corrio de su rafaga actual
+class SJFScheduler(AbstractScheduler):
+
+    PREDICT_PROGRAM = 'program'
+    PREDICT_AVERAGE = 'average'
+
+    def __init__(self, prediction = PREDICT_PROGRAM, alpha = 0.5, initialEstimate = 5):
+        super().__init__()
+        self._readyQueue = []
+        self._seq = 0
+        self._prediction = prediction
+        self._alpha = alpha
+        self._initialEstimate = initialEstimate
+        # path -> para cada instruccion, cuantas faltan hasta el proximo I/O o EXIT (incluido)
+        # (se descarta cuando termina el ultimo proceso vivo que corre ese programa)
+        self._burstTables = dict()
+        # path -> pids de los procesos vivos que usan su tabla
+        self._burstTableUsers = dict()
+        # pid -> rafaga estimada y pid -> cpuTicks al empezar la rafaga actual
+        self._estimates = dict()
+        self._burstStart = dict()
+
+    def _burstTable(self, pcb):
+        path = pcb.path
+        self._burstTableUsers.setdefault(path, set()).add(pcb.pid)
+        table = self._burstTables.get(path)
+        if table is None:
+            instructions = self._kernel.fileSystem.read(path).instructions
+            table = [0] * len(instructions)
+            remaining = 0
+            for i in range(len(instructions) - 1, -1, -1):
+                if ASM.isIO(instructions[i]) or ASM.isEXIT(instructions[i]):
+                    remaining = 1
+                else:
+                    remaining += 1
+                table[i] = remaining
+            self._burstTables[path] = table
+        return table
+
+    ## rafaga restante estimada; "ran" son los ticks corridos desde el ultimo Dispatcher.save
+    def predictedBurst(self, pcb, pc = None, ran = 0):
+        if self._prediction == self.PREDICT_PROGRAM:
+            table = self._burstTable(pcb)
+            pc = pcb.pc if pc is None else pc
+            return table[pc] if pc < len(table) else 0
+        estimate = self._estimates.get(pcb.pid, self._initialEstimate)
+        current = pcb.cpuTicks + ran - self._burstStart.get(pcb.pid, 0)
+        return max(estimate - current, 0)
+
+    ## rafaga restante del proceso que esta corriendo
+    def _runningBurst(self, runningPCB):
+        ran = self._kernel.getDispatcher().runningTicks()
+        return self.predictedBurst(runningPCB, self._kernel.hardware.cpu.pc, ran)
+
+    def add(self, pcb):
+        heapq.heappush(self._readyQueue, (self.predictedBurst(pcb), self._seq, pcb))
+        self._seq += 1
+
+    def getNext(self):
+        if self.isEmpty():
+            return None
+        return heapq.heappop(self._readyQueue)[2]
+
+    def isEmpty(self):
+        return not self._readyQueue
+
+    def ioStarted(self, pcb):
+        burst = pcb.cpuTicks - self._burstStart.get(pcb.pid, 0)
+        estimate = self._estimates.get(pcb.pid, self._initialEstimate)
+        self._estimates[pcb.pid] = self._alpha * burst + (1 - self._alpha) * estimate
+        self._burstStart[pcb.pid] = pcb.cpuTicks
+
+    def terminated(self, pcb):
+        self._estimates.pop(pcb.pid, None)
+        self._burstStart.pop(pcb.pid, None)
+        users = self._burstTableUsers.get(pcb.path)
+        if users is not None:
+            users.discard(pcb.pid)
+            if not users:
+                del self._burstTableUsers[pcb.path]
+                del self._burstTables[pcb.path]
+
+## Shortest Remaining Time First: SJF expropiativo, un proceso que llega (o vuelve de I/O)
+## con una rafaga estimada menor a lo que le queda al que esta corriendo, lo expropia
+class SRTFScheduler(SJFScheduler):
+
+    def mustExpropiate(self, pcb, runningPCB):
+        return self.predictedBurst(pcb) < self._runningBurst(runningPCB)
+
+
+
+## Earliest Deadline First: siempre corre el proceso con el deadline absoluto mas cercano
+## (heap por deadline); uno que llega con un deadline anterior al del que esta corriendo lo expropia.
+## Los procesos sin deadline corren cuando no hay ninguno de tiempo real, en orden de llegada
+class EDFScheduler(AbstractScheduler):
+
+    def __init__(self):
+        super().__init__()
+        self._readyQueue = []
+        self._seq = 0
+
+    ## clave del heap: menor clave, mas urgente
+    def keyOf(self, pcb):
+        if pcb.deadline is None:
+            return math.inf
+        return pcb.deadline
+
+    def add(self, pcb):
+        heapq.heappush(self._readyQueue, (self.keyOf(pcb), self._seq, pcb))
+        self._seq += 1
+
+    def getNext(self):
+        if self.isEmpty():
+            return None
+        return heapq.heappop(self._readyQueue)[2]
+
+    def isEmpty(self):
+        return not self._readyQueue
+
+    def mustExpropiate(self, pcb, runningPCB):
+        return self.keyOf(pcb) < self.keyOf(runningPCB)
+
+
+## Rate-monotonic: prioridad fija segun el periodo (menor periodo, mas prioridad).
+## Un proceso sin periodo usa su deadline relativo (deadline-monotonic)
+class RateMonotonicScheduler(EDFScheduler):
+
+    def keyOf(self, pcb):
+        if pcb.period is not None:
+            return pcb.period
+        if pcb.deadline is not None:
+            return pcb.deadline - pcb.arrivalTick
+        return math.inf
+
+
+## cantidad de tickets (parte proporcional del CPU) que le corresponde a cada prioridad
+## (0 es la mas alta): los usan LotteryScheduler y StrideScheduler
+def ticketsOf(pcb):
+    priority = min(max(pcb.priority, 0), 4)
+    return (5 - priority) * 100
+
+
+## Fenwick tree (binary indexed tree) de pesos: actualizar un peso y buscar en que posicion cae
+## una suma acumulada son O(log n)
+class FenwickTree():
+
+    def __init__(self, size):
+        self._tree = [0] * (size + 1)
+        self._weights = [0] * size
+        self._total = 0
+
+    @property
+    def size(self):
+        return len(self._weights)
+
+    @property
+    def total(self):
+        return self._total
+
+    def weight(self, index):
+        return self._weights[index]
+
+    def add(self, index, delta):
+        self._weights[index] += delta
+        self._total += delta
+        i = index + 1
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & (-i)
+
+    ## duplica la capacidad (reconstruye el arbol en O(n))
+    def grow(self):
+        weights = self._weights + [0] * len(self._weights)
+        self._weights = weights
+        self._tree = [0] + weights
+        for i in range(1, len(self._tree)):
+            parent = i + (i & (-i))
+            if parent < len(self._tree):
+                self._tree[parent] += self._tree[i]
+
+    ## posicion donde cae "value" (0 <= value < total): la menor con suma acumulada > value
+    def find(self, value):
+        position = 0
+        step = 1 << (len(self._tree) - 1).bit_length()
+        while step > 0:
+            next = position + step
+            if next < len(self._tree) and self._tree[next] <= value:
+                position = next
+                value -= self._tree[next]
+            step >>= 1
+        return position
+
+
+## Lottery scheduling: cada proceso listo tiene tantos tickets como indica su prioridad y en cada
+## despacho se sortea uno; la probabilidad de correr es proporcional a los tickets.
+## Los tickets de la ready queue estan en un Fenwick tree: el sorteo es O(log n)
+class LotteryScheduler(AbstractScheduler):
+
+    def __init__(self, quantum, seed = 0):
+        super().__init__()
+        self._quantum = quantum
+        self._random = random.Random(seed)
+        self._tickets = FenwickTree(16)
+        # posicion en el arbol -> pcb, y posiciones libres para reusar
+        self._slots = [None] * 16
+        self._freeSlots = list(range(15, -1, -1))
+        self._size = 0
+
+    def setup(self, kernel):
+        super().setup(kernel)
+        kernel.hardware.timer.quantum = self._quantum
+
+    def add(self, pcb):
+        if not self._freeSlots:
+            size = self._tickets.size
+            self._tickets.grow()
+            self._slots.extend([None] * size)
+            self._freeSlots = list(range(2 * size - 1, size - 1, -1))
+        slot = self._freeSlots.pop()
+        self._slots[slot] = pcb
+        self._tickets.add(slot, ticketsOf(pcb))
+        self._size += 1
+
+    def getNext(self):
+        if self.isEmpty():
+            return None
+        slot = self._tickets.find(self._random.randrange(self._tickets.total))
+        pcb = self._slots[slot]
+        self._tickets.add(slot, -self._tickets.weight(slot))
+        self._slots[slot] = None
+        self._freeSlots.append(slot)
+        self._size -= 1
+        return pcb
+
+    def isEmpty(self):
+        return self._size == 0
+
+    def timeoutPing(self, handler):
+        handler.timeoutSwitch()
+
+
+## Stride scheduling: la version deterministica de lottery. Cada proceso avanza su "pass"
+## en stride = STRIDE1 / tickets por cada quantum de CPU que usa (proporcional a lo que corrio)
+## y siempre corre el de menor pass: un heap de pass hace la seleccion O(log n)
+class StrideScheduler(AbstractScheduler):
+
+    STRIDE1 = 1 << 20
+
+    def __init__(self, quantum):
+        super().__init__()
+        self._quantum = quantum
+        self._readyQueue = []
+        self._seq = 0
+        # pid -> pass y pid -> cpuTicks ya cobrados en el pass
+        self._passes = dict()
+        self._charged = dict()
+        self._globalPass = 0
+
+    def setup(self, kernel):
+        super().setup(kernel)
+        kernel.hardware.timer.quantum = self._quantum
+
+    def strideOf(self, pcb):
+        return self.STRIDE1 // ticketsOf(pcb)
+
+    def add(self, pcb):
+        ran = pcb.cpuTicks - self._charged.get(pcb.pid, 0)
+        self._charged[pcb.pid] = pcb.cpuTicks
+        passValue = self._passes.get(pcb.pid, self._globalPass) + self.strideOf(pcb) * ran // self._quantum
+        # un proceso que estuvo bloqueado no acumula credito: arranca desde el pass global
+        passValue = max(passValue, self._globalPass)
+        self._passes[pcb.pid] = passValue
+        heapq.heappush(self._readyQueue, (passValue, self._seq, pcb))
+        self._seq += 1
+
+    def getNext(self):
+        if self.isEmpty():
+            return None
+        passValue, _, pcb = heapq.heappop(self._readyQueue)
+        self._globalPass = max(self._globalPass, passValue)
+        return pcb
+
+    def isEmpty(self):
+        return not self._readyQueue
+
+    def timeoutPing(self, handler):
+        handler.timeoutSwitch()
+
+    def terminated(self, pcb):
+        self._passes.pop(pcb.pid, None)
+        self._charged.pop(pcb.pid, None)
+
+
+
+## Round Robin. Con adaptive = True el quantum se ajusta solo, a partir de las rafagas de CPU observadas:
+##   - cada rafaga que termina (el proceso pide I/O o termina) es una muestra de su largo
+##   - una rafaga cortada por timeout es una muestra censurada: dura por lo menos lo que corrio
+##     hasta ahi (se actualiza en cada timeout y se reemplaza por el largo real cuando termina)
+##   - el quantum es el percentil "percentile" de las ultimas "window" rafagas terminadas mas las
+##     censuradas, entre 1 y maxQuantum (por default 4 veces el quantum inicial)
+## Asi el quantum alcanza para que la mayoria de las rafagas cortas (procesos de I/O) terminen sin
+## timeout, y crece cuando dominan las rafagas largas (fases de CPU) para no cortarlas de mas
+class RoundRobinScheduler(AbstractScheduler):
+
+    def __init__(self, quantum, adaptive = False, percentile = 80, window = 16, maxQuantum = None):
+        super().__init__()
+        self._readyQueue = deque()
+        self._quantum = quantum
+        self._adaptive = adaptive
+        self._percentile = percentile
+        self._maxQuantum = maxQuantum if maxQuantum is not None else 4 * quantum
+        self._bursts = deque(maxlen=window)
+        # pid -> cpuTicks al empezar la rafaga actual
+        self._burstStart = dict()
+        # pid -> lo que lleva corrido la rafaga actual, si ya la corto un timeout
+        self._censored = dict()
+
+    def setup(self, kernel):
+        super().setup(kernel)
+        kernel.hardware.timer.quantum = self._quantum
+
+    @property
+    def quantum(self):
+        return self._quantum
 
     def add(self, pcb):
         self._readyQueue.append(pcb)
@@ -441,93 +1472,237 @@ class RoundRobinScheduler(AbstractScheduler):
     def getNext(self):
         if self.isEmpty():
             return None
-        return self._readyQueue.pop(0)
+        return self._readyQueue.popleft()
 
     def isEmpty(self):
         return not self._readyQueue
     
     def timeoutPing(self, handler):
+        if self._adaptive:
+            pcb = self._kernel.getRunningPCB()
+            ran = self._kernel.getDispatcher().runningTicks()
+            self._censored[pcb.pid] = pcb.cpuTicks + ran - self._burstStart.get(pcb.pid, 0)
+            self._retune()
+            if self._kernel.isEmpty():
+                # no hay nadie esperando: sigue el mismo proceso con un quantum nuevo (sin timeouts inutiles)
+                self._kernel.hardware.timer.reset()
+                return
         handler.timeoutSwitch()
 
+    def ioStarted(self, pcb):
+        self._endBurst(pcb)
 
+    def terminated(self, pcb):
+        self._endBurst(pcb)
+        self._burstStart.pop(pcb.pid, None)
 
-class Loader():
+    def _endBurst(self, pcb):
+        if self._adaptive:
+            burst = pcb.cpuTicks - self._burstStart.get(pcb.pid, 0)
+            self._burstStart[pcb.pid] = pcb.cpuTicks
+            self._censored.pop(pcb.pid, None)
+            if burst > 0:
+                self._bursts.append(burst)
+                self._retune()
 
-    def __init__(self, fileSystem, memoryManager):
-        self._fileSystem = fileSystem
-        self._memoryManager = memoryManager
+    def _retune(self):
+        ordered = sorted(list(self._bursts) + list(self._censored.values()))
+        # percentil por rango mas cercano
+        rank = max(math.ceil(self._percentile / 100 * len(ordered)) - 1, 0)
+        self._quantum = min(max(ordered[rank], 1), self._maxQuantum)
+        self._kernel.hardware.timer.quantum = self._quantum
 
 
-    def load(self, path):
-        program = self._fileSystem.read(path)
-        instructions = program.instructions
-        frameSize = HARDWARE.mmu.frameSize
-        numFrames = math.ceil(len(instructions) / frameSize)
+## Weighted Round Robin: una sola cola FIFO, pero cada proceso corre un time slice proporcional
+## a su prioridad: quantum * (5 - prioridad), o sea 5 quantums la prioridad 0 y 1 la prioridad 4
+class WeightedRoundRobinScheduler(AbstractScheduler):
+
+    def __init__(self, quantum):
+        super().__init__()
+        self._readyQueue = deque()
+        self._quantum = quantum
+
+    def timeSlice(self, pcb):
+        return self._quantum * (5 - min(max(pcb.priority, 0), 4))
+
+    def add(self, pcb):
+        self._readyQueue.append(pcb)
+
+    def getNext(self):
+        if self.isEmpty():
+            return None
+        return self._readyQueue.popleft()
+
+    def isEmpty(self):
+        return not self._readyQueue
+
+    def timeoutPing(self, handler):
+        if self.isEmpty():
+            self._renewTimeSlice(self._kernel.getRunningPCB())
+        else:
+            handler.timeoutSwitch()
+
+
+
+## Tabla de paginas de un espacio de direcciones de "size" direcciones, en dos niveles: un directorio
+## con tablas de 2 ** TABLE_BITS entradas que se crean cuando se carga la primera pagina de su rango
+## y se liberan cuando se desaloja la ultima. Las paginas que nunca se cargan no ocupan memoria,
+## asi que un programa muy largo del que solo se ejecuta el principio cuesta lo mismo que uno corto
+class PageTable():
 
-        pageTable = dict()
-        for i in range(numFrames):
-            pageTable[i] = None
+    TABLE_BITS = 6
 
-        #
-        #  page1 = none
-        #  page2 = none
-        #  page3 = none
-        #
+    def __init__(self, size, frameSize):
+        # ultima direccion logica valida del proceso
+        self._limit = size - 1
+        self._pageCount = math.ceil(size / frameSize)
+        # numero de tabla -> [frame de cada pagina de la tabla, cantidad de paginas cargadas]
+        self._directory = dict()
 
+    @property
+    def limit(self):
+        return self._limit
+
+    @property
+    def pageCount(self):
+        return self._pageCount
 
-        ## page  -  frame  - cargado
-        # 1  - none  - false
-        # 2 - 3 - false
+    ## cantidad de tablas de segundo nivel creadas
+    @property
+    def tableCount(self):
+        return len(self._directory)
 
-        # -----
-        # 2 - 4 - false
+    def __len__(self):
+        return self._pageCount
 
+    def __getitem__(self, pageId):
+        if not 0 <= pageId < self._pageCount:
+            raise IndexError("Invalid page {pageId}, the process has {count} pages".format(pageId=pageId, count=self._pageCount))
+        table = self._directory.get(pageId >> self.TABLE_BITS)
+        if table is None:
+            return None
+        return table[0][pageId & ((1 << self.TABLE_BITS) - 1)]
+
+    def get(self, pageId, default = None):
+        if not 0 <= pageId < self._pageCount:
+            return default
+        frame = self[pageId]
+        return default if frame is None else frame
+
+    def __setitem__(self, pageId, frame):
+        if not 0 <= pageId < self._pageCount:
+            raise IndexError("Invalid page {pageId}, the process has {count} pages".format(pageId=pageId, count=self._pageCount))
+        tableId = pageId >> self.TABLE_BITS
+        entry = pageId & ((1 << self.TABLE_BITS) - 1)
+        table = self._directory.get(tableId)
+        if table is None:
+            if frame is None:
+                return
+            table = [[None] * (1 << self.TABLE_BITS), 0]
+            self._directory[tableId] = table
+        previous = table[0][entry]
+        table[0][entry] = frame
+        if previous is None and frame is not None:
+            table[1] += 1
+        elif previous is not None and frame is None:
+            table[1] -= 1
+            if table[1] == 0:
+                del self._directory[tableId]
+
+    ## (pagina, frame) de las paginas cargadas
+    def items(self):
+        for tableId, (frames, _) in self._directory.items():
+            base = tableId << self.TABLE_BITS
+            for entry, frame in enumerate(frames):
+                if frame is not None:
+                    yield base + entry, frame
+
+    ## frames de las paginas cargadas
+    def values(self):
+        return [frame for _, frame in self.items()]
 
-        return pageTable
+    def __repr__(self):
+        return "PageTable(pages={pages}, loaded={loaded})".format(pages=self._pageCount, loaded=dict(self.items()))
 
-        # PCB 1
-        # page1 = 1 TODO Borrar comentarios y fijarse estos casos
 
-        # PCB2
-        # page1 = 1
+class Loader():
+
+    def __init__(self, fileSystem, memoryManager, hardware):
+        self._fileSystem = fileSystem
+        self._memoryManager = memoryManager
+        self._hardware = hardware
+        self._pageFaults = 0
+
+    @property
+    def pageFaults(self):
+        return self._pageFaults
+
+
+    def load(self, path):
+        program = self._fileSystem.read(path)
+        instructions = program.instructions
+        frameSize = self._hardware.mmu.frameSize
+
+        # las paginas se cargan recien cuando se las referencia (page fault)
+        return PageTable(len(instructions), frameSize)
 
     def loadPage(self, pcb, pageId):
+        self._pageFaults += 1
+        pcb.countPageFault()
+
         # Asigna un nuevo frame para la página faltante
-        frame = self._memoryManager.allocFrame()
+        frame = self._memoryManager.allocFrame(pcb, pageId)
 
-        # Se lo asigna al pcb y mmu
+        # Se lo asigna al pcb (el mmu recorre su page table)
         pcb.pageTable[pageId] = frame
-        HARDWARE.mmu.setPageFrame(pageId, frame)
 
         # Lo escribo en memoria
         program = self._fileSystem.read(pcb.path)
-        frameSize = HARDWARE.mmu.frameSize
+        frameSize = self._hardware.mmu.frameSize
         startInstr = pageId * frameSize
         endInstr = startInstr + frameSize
         instructions = program.instructions[startInstr:endInstr]
         frameStartAddr = frame * frameSize
         for offset, instr in enumerate(instructions):
-            HARDWARE.memory.write(frameStartAddr + offset, instr)
+            self._hardware.memory.write(frameStartAddr + offset, instr)
 
 
 
 class Dispatcher():
 
-    def load(self, pcb):
-        HARDWARE.cpu.pc = pcb.pc
+    def __init__(self, hardware):
+        self._hardware = hardware
+        self._contextSwitches = 0
+        # instrucciones ejecutadas por el CPU al cargar el proceso actual
+        self._executedAtLoad = 0
+
+    @property
+    def contextSwitches(self):
+        return self._contextSwitches
+
+    ## instrucciones que ejecuto el proceso actual desde que se cargo en el CPU
+    def runningTicks(self):
+        return self._hardware.cpu.executed - self._executedAtLoad
 
-        HARDWARE.mmu.resetTLB()
+    def load(self, pcb):
+        self._contextSwitches += 1
+        pcb.countDispatch()
+        self._executedAtLoad = self._hardware.cpu.executed
+        self._hardware.cpu.pc = pcb.pc
 
-        for pageNumber, frameNumber in pcb.pageTable.items():
-            HARDWARE.mmu.setPageFrame(pageNumber, frameNumber)
+        # la TLB no se vacia: sus entradas estan etiquetadas con el pid
+        self._hardware.mmu.limit = pcb.limit
+        self._hardware.mmu.switchAddressSpace(pcb.pid, pcb.pageTable)
 
-        HARDWARE.timer.reset()
-        print("#### LOADING PROGRAM: ", pcb.pid, "####")
+        self._hardware.timer.timeSlice = pcb.timeSlice
+        self._hardware.timer.reset()
+        log.logger.info("#### LOADING PROGRAM: {pid} ####".format(pid=pcb.pid))
 
     def save(self, pcb):
-        pcb.pc = HARDWARE.cpu.pc
+        pcb.addCpuTicks(self._hardware.cpu.executed - self._executedAtLoad)
+        pcb.pc = self._hardware.cpu.pc
         pcb.resetAgedPriority()
-        HARDWARE.cpu.pc = -1
+        self._hardware.cpu.pc = -1
 
 
 
@@ -548,6 +1723,20 @@ class PCB():
         self._priority = priority
         self._agedPriority = priority
         self._pageTable = pageTable
+        # a quien avisarle cuando cambia el estado: stateListener(pcb, estadoAnterior)
+        self._stateListener = None
+        # contadores para las estadisticas
+        self._arrivalTick = None
+        self._completionTick = None
+        self._cpuTicks = 0
+        self._ioOperations = 0
+        self._pageFaults = 0
+        self._dispatches = 0
+        # tiempo real: tick absoluto en el que tiene que haber terminado y periodo (None si no tiene)
+        self._deadline = None
+        self._period = None
+        # ciclos que puede correr cada vez que se carga (None: el quantum global del timer)
+        self._timeSlice = None
 
 
     @property
@@ -574,7 +1763,18 @@ class PCB():
     def state(self, value):
         if type(value) is not PCBState:
             raise ValueError("state debe ser un valor de PCBState")
+        oldState = self._state
         self._state = value
+        if self._stateListener is not None and oldState != value:
+            self._stateListener(self, oldState)
+
+    @property
+    def stateListener(self):
+        return self._stateListener
+
+    @stateListener.setter
+    def stateListener(self, listener):
+        self._stateListener = listener
 
     @property
     def path(self):
@@ -602,9 +1802,96 @@ class PCB():
     def pageTable(self):
         return self._pageTable
 
+    ## ultima direccion logica valida del proceso
+    @property
+    def limit(self):
+        return self._pageTable.limit
+
     def resetAgedPriority(self):
         self._agedPriority = self._priority
 
+    @property
+    def arrivalTick(self):
+        return self._arrivalTick
+
+    @arrivalTick.setter
+    def arrivalTick(self, tick):
+        self._arrivalTick = tick
+
+    @property
+    def completionTick(self):
+        return self._completionTick
+
+    @completionTick.setter
+    def completionTick(self, tick):
+        self._completionTick = tick
+
+    @property
+    def cpuTicks(self):
+        return self._cpuTicks
+
+    def addCpuTicks(self, ticks):
+        self._cpuTicks += ticks
+
+    @property
+    def ioOperations(self):
+        return self._ioOperations
+
+    def countIO(self):
+        self._ioOperations += 1
+
+    @property
+    def pageFaults(self):
+        return self._pageFaults
+
+    def countPageFault(self):
+        self._pageFaults += 1
+
+    @property
+    def dispatches(self):
+        return self._dispatches
+
+    def countDispatch(self):
+        self._dispatches += 1
+
+    @property
+    def timeSlice(self):
+        return self._timeSlice
+
+    @timeSlice.setter
+    def timeSlice(self, ticks):
+        self._timeSlice = ticks
+
+    @property
+    def deadline(self):
+        return self._deadline
+
+    @deadline.setter
+    def deadline(self, tick):
+        self._deadline = tick
+
+    @property
+    def period(self):
+        return self._period
+
+    @period.setter
+    def period(self, ticks):
+        self._period = ticks
+
+    ## ticks que termino despues de su deadline (negativo si termino antes, None si no tiene
+    ## deadline o no termino). El proceso termina al final del tick en que ejecuto el EXIT
+    @property
+    def lateness(self):
+        if self._deadline is None or self._completionTick is None:
+            return None
+        return self._completionTick + 1 - self._deadline
+
+    ## registro compacto del proceso, para guardarlo una vez que termino
+    def toRecord(self):
+        return PCBRecord(self._pid, self._path, self._priority, self._arrivalTick, self._completionTick,
+                         self._cpuTicks, self._ioOperations, self._pageFaults, self._dispatches,
+                         self._deadline, self.lateness)
+
     def _setInBoundValue(self, value):
         valueIn = min(value, 4)
         valueIn = max(valueIn, 0)
@@ -615,29 +1902,107 @@ class PCB():
         return "PCB(pid={pid}, pc={pc}, state={state}, path={path})".format(pid=self._pid,pc=self._pc, state=self._state, path=self._path)
 
 
+## lo que queda de un proceso terminado, una vez que sale de la PCBTable
+PCBRecord = namedtuple('PCBRecord', ['pid', 'path', 'priority', 'arrival', 'completion',
+                                     'cpuTicks', 'ioOperations', 'pageFaults', 'dispatches',
+                                     'deadline', 'lateness'])
+
+
 class PCBTable():
 
     def __init__(self):
-        self._pcbs = []
+        # pid -> pcb
+        self._pcbs = dict()
+        # indice por estado: estado -> (pid -> pcb)
+        self._byState = {state: dict() for state in PCBState}
         self._pid_counter = 0
         self._runningPCB = None
+        # procesos que cambiaron de estado desde la ultima muestra (pid -> pcb, en orden)
+        self._changed = dict()
+        # pids que salieron de la tabla pero siguen en _changed esperando la proxima muestra
+        self._reaped = []
+        # registros de los procesos terminados que ya salieron de la tabla
+        self._archive = []
 
     @property
     def pcbs(self):
-        return self._pcbs
+        return self._pcbs.values()
+
+    def __len__(self):
+        return len(self._pcbs)
 
     def get(self, pid):
-        for pcb in self._pcbs:
-            if pcb.pid == pid:
-                return pcb
-        log.logger.warning("No existe un proceso con ese PID")
-        return None
+        pcb = self._pcbs.get(pid)
+        if pcb is None:
+            log.logger.warning("No existe un proceso con ese PID")
+        return pcb
 
     def add(self, pcb):
-        self._pcbs.append(pcb)
+        self._pcbs[pcb.pid] = pcb
+        self._byState[pcb.state][pcb.pid] = pcb
+        pcb.stateListener = self._stateChanged
+        self._changed[pcb.pid] = pcb
+
+    ## keepSample: el ultimo cambio de estado del proceso queda pendiente para la proxima muestra
+    ## (ver popChanged); si no, no queda ninguna referencia al pcb (ni a su page table) en la tabla
+    def remove(self, pid, keepSample = False):
+        pcb = self._pcbs.pop(pid, None)
+        if pcb is not None:
+            del self._byState[pcb.state][pid]
+            if keepSample and pid in self._changed:
+                self._reaped.append(pid)
+            else:
+                self._changed.pop(pid, None)
+            pcb.stateListener = None
+            if self._runningPCB is pcb:
+                self._runningPCB = None
+
+    ## saca el proceso de la tabla y guarda su registro (PCBRecord) en el archivo
+    def archive(self, pid, keepSample = False):
+        pcb = self._pcbs.get(pid)
+        if pcb is None:
+            log.logger.warning("No existe un proceso con ese PID")
+            return None
+        self.remove(pid, keepSample)
+        record = pcb.toRecord()
+        self._archive.append(record)
+        return record
 
-    def remove(self, pid):
-        self._pcbs = [pcb for pcb in self._pcbs if pcb.pid != pid]
+    @property
+    def archived(self):
+        return self._archive
+
+    ## procesos en un estado dado
+    def inState(self, state):
+        return self._byState[state].values()
+
+    def countInState(self, state):
+        return len(self._byState[state])
+
+    ## procesos que todavia no terminaron
+    def livePcbs(self):
+        for state in PCBState:
+            if state != PCBState.TERMINATED:
+                yield from self._byState[state].values()
+
+    def _stateChanged(self, pcb, oldState):
+        del self._byState[oldState][pcb.pid]
+        self._byState[pcb.state][pcb.pid] = pcb
+        self._changed[pcb.pid] = pcb
+
+    ## devuelve los procesos que cambiaron de estado desde la ultima llamada
+    def popChanged(self):
+        changed = list(self._changed.values())
+        self._changed = dict()
+        self._reaped = []
+        return changed
+
+    ## descarta los cambios pendientes de los procesos que ya salieron de la tabla
+    ## (cuando nadie va a tomar la muestra)
+    def dropReapedSamples(self):
+        for pid in self._reaped:
+            self._changed.pop(pid, None)
+        self._reaped = []
 
     def getNewPID(self):
         pid = self._pid_counter
@@ -645,7 +2010,7 @@ class PCBTable():
         return pid
 
     def __repr__(self):
-        return "PCBTable({pcbs})".format(pcbs=self._pcbs)
+        return "PCBTable({pcbs})".format(pcbs=list(self._pcbs.values()))
     
     @property
     def runningPcb(self):
@@ -653,7 +2018,7 @@ class PCBTable():
     
     @runningPcb.setter
     def runningPcb(self, pcb):
-        if not pcb in self._pcbs:
+        if not pcb.pid in self._pcbs:
             raise ValueError("Ese proceso no existe")
         self._runningPCB = pcb
 
@@ -669,58 +2034,387 @@ class PCBTable():
 
 class StatInterruptionHandler(AbstractInterruptionHandler):
     def execute(self, irq):
-        tick = HARDWARE.clock.currentTick
-        for pcb in self.kernel.getPCBTable().pcbs:
+        tick = self.kernel.hardware.clock.currentTick
+        # la muestra puede cubrir varios ticks si el clock salteo ciclos sin eventos
+        ticks = irq.parameters or 1
+        # solo se registran los procesos que cambiaron de estado desde la muestra anterior
+        for pcb in self.kernel.getPCBTable().popChanged():
             self.kernel.gantt.log(pcb.pid, pcb.state, tick)
+        self.kernel.gantt.sampled(tick + ticks - 1)
 
 
 class GanttChart():
 
     def __init__(self):
-        # Diccionario: pid -> lista de (tick, estado)
+        # Diccionario: pid -> lista de (tick, estado), una entrada por cada cambio de estado:
+        # el proceso esta en "estado" desde "tick" hasta el tick de la entrada siguiente
         self.timeline = {}
+        # ultimo tick muestreado (el fin del ultimo intervalo de cada proceso)
+        self._lastTick = -1
+        # pid -> tick absoluto del deadline (solo los procesos de tiempo real)
+        self._deadlines = dict()
 
+    ## registra que a partir de "tick" el proceso esta en "estado"
     def log(self, pid, estado, tick):
         if pid not in self.timeline:
             self.timeline[pid] = []
-        self.timeline[pid].append((tick, estado))
+        events = self.timeline[pid]
+        if not events or events[-1][1] != estado:
+            events.append((tick, estado))
+        self.sampled(tick)
+
+    ## registra que se tomo una muestra en "tick" (los estados siguen iguales hasta ahi)
+    def sampled(self, tick):
+        if tick > self._lastTick:
+            self._lastTick = tick
+
+    @property
+    def lastTick(self):
+        return self._lastTick
+
+    ## pids en el orden en que aparecieron en el diagrama
+    def pids(self):
+        return list(self.timeline.keys())
+
+    def setDeadline(self, pid, tick):
+        self._deadlines[pid] = tick
+
+    def deadline(self, pid):
+        return self._deadlines.get(pid)
+
+    ## intervalos (tickInicial, tickFinal, estado) del proceso, con tickFinal excluido
+    ## (las metricas de cada proceso se calculan a partir de aca, sirven para cualquier almacenamiento)
+    def intervals(self, pid):
+        events = self.timeline.get(pid, [])
+        for i, (tick, estado) in enumerate(events):
+            if i + 1 < len(events):
+                end = events[i + 1][0]
+            else:
+                end = self._lastTick + 1
+            yield (tick, end, estado)
+
+    ## (tick en que el proceso aparece en el diagrama, primer tick en "estado");
+    ## el segundo es None si nunca estuvo en ese estado
+    def _firstIn(self, pid, estado):
+        arrival = None
+        for start, end, state in self.intervals(pid):
+            if arrival is None:
+                arrival = start
+            if state == estado:
+                return arrival, start
+        return arrival, None
+
+    ## ticks desde que el proceso aparece en el diagrama hasta que termina (None si no termino)
+    def turnaroundTime(self, pid):
+        arrival, tick = self._firstIn(pid, PCBState.TERMINATED)
+        if tick is None:
+            return None
+        return tick - arrival
+
+    ## ticks que el proceso paso en la ready queue
+    def waitingTime(self, pid):
+        return sum(end - start for start, end, estado in self.intervals(pid) if estado == PCBState.READY)
+
+    ## ticks desde que el proceso aparece hasta que corre por primera vez (None si nunca corrio)
+    def responseTime(self, pid):
+        arrival, tick = self._firstIn(pid, PCBState.RUNNING)
+        if tick is None:
+            return None
+        return tick - arrival
+
+    ## ticks entre el deadline y el tick en que aparece TERMINATED (negativo si termino antes;
+    ## None si no tiene deadline o no termino)
+    def lateness(self, pid):
+        deadline = self._deadlines.get(pid)
+        if deadline is None:
+            return None
+        tick = self._firstIn(pid, PCBState.TERMINATED)[1]
+        if tick is None:
+            return None
+        return tick - deadline
+
+    ## metricas de todos los procesos: diccionario de listas alineadas con 'pids'
+    def summary(self):
+        pids = self.pids()
+        return {
+            'pids': pids,
+            'turnaround': [self.turnaroundTime(pid) for pid in pids],
+            'waiting': [self.waitingTime(pid) for pid in pids],
+            'response': [self.responseTime(pid) for pid in pids],
+            'deadline': [self.deadline(pid) for pid in pids],
+            'lateness': [self.lateness(pid) for pid in pids],
+        }
+
+    ## pids de los procesos que no cumplieron su deadline: los que terminaron tarde y los que
+    ## todavia no terminaron y ya se les paso
+    def missedDeadlines(self):
+        summary = self.summary()
+        missed = []
+        for pid, deadline, lateness in zip(summary['pids'], summary['deadline'], summary['lateness']):
+            if deadline is None:
+                continue
+            if lateness is None:
+                # no termino: ya lo perdio si el deadline quedo atras del ultimo tick muestreado
+                late = self._lastTick + 1 > deadline
+            else:
+                late = lateness > 0
+            if late:
+                missed.append(pid)
+        return missed
+
+    ## fraccion de ticks con algun proceso RUNNING, por ventanas de "window" ticks
+    def cpuUtilization(self, window = 1):
+        busy = [False] * (self._lastTick + 1)
+        for pid in self.pids():
+            for start, end, estado in self.intervals(pid):
+                if estado == PCBState.RUNNING:
+                    for tick in range(start, end):
+                        busy[tick] = True
+        curve = []
+        for start in range(0, len(busy), window):
+            ticks = busy[start:start + window]
+            curve.append(sum(ticks) / len(ticks))
+        return curve
 
     def print_gantt(self):
+        self.render(sys.stdout)
+
+    ## escribe el diagrama en "out" (cualquier objeto con write) de a paginas de "pageSize" ticks,
+    ## para la ventana de ticks [startTick, endTick) y solo los pids indicados (todos por default).
+    ## pageSize = None: todo en una sola pagina
+    ## Recorre los intervalos de cada proceso una sola vez y nunca arma mas de una pagina por fila
+    def render(self, out = None, startTick = 0, endTick = None, pids = None, pageSize = None):
 
         #  DIAGRAMA DE GANTT
         #  PID | TICK 1 | TICK 2 | TICK 3 | TICK 4 | ...
         #   1  |   Run  |   Wai  |  Rea   |  Run   | ...
         #   2  |   Rea  |   Run  |  Run   |  Ter   | ...
 
-        print("DIAGRAMA DE GANTT")
+        if out is None:
+            out = sys.stdout
+        if endTick is None:
+            # hasta el ultimo tick muestreado (incluido)
+            endTick = self._lastTick + 1
+        if pids is None:
+            pids = self.pids()
+        else:
+            known = set(self.pids())
+            pids = [pid for pid in pids if pid in known]
+        if pageSize is None:
+            pageSize = max(endTick - startTick, 0)
+        elif pageSize <= 0:
+            raise ValueError("pageSize tiene que ser positivo: {pageSize}".format(pageSize=pageSize))
+
+        out.write("DIAGRAMA DE GANTT\n")
+
+        # por cada proceso: el iterador de sus intervalos y el intervalo actual
+        cursors = dict()
+        for pid in pids:
+            intervals = self.intervals(pid)
+            cursors[pid] = [intervals, next(intervals, None)]
+
+        pageStart = startTick
+        while True:
+            pageEnd = min(pageStart + pageSize, endTick)
+
+            # -- Header --
+            header = "  PID   |"
+            for tick in range(pageStart, pageEnd):
+                header += " TICK {0:<3}|".format(tick)
+            out.write(header + "\n")
+
+            # -- Rows --
+            for pid in pids:
+                # PID del procesos
+                row = "  {0:<3}   |".format(pid)
+                cells = self._renderCells(cursors[pid], pageStart, pageEnd)
+                out.write(row + "".join(cells) + "\n")
+
+            pageStart = pageEnd
+            if pageStart >= endTick:
+                break
+            out.write("\n")
+
+    ## primeras 3 letras del estado del proceso en cada tick de [pageStart, pageEnd)
+    ## (antes de la primera muestra y despues de TER la celda queda vacia)
+    def _renderCells(self, cursor, pageStart, pageEnd):
+        cells = ["         |"] * (pageEnd - pageStart)
+        while cursor[1] is not None and cursor[1][0] < pageEnd:
+            start, end, estado = cursor[1]
+            if estado == PCBState.TERMINATED:
+                end = start + 1
+            cell = "   {0}   |".format(estado.value[:3])
+            for tick in range(max(start, pageStart), min(end, pageEnd)):
+                cells[tick - pageStart] = cell
+            if end > pageEnd:
+                # el intervalo sigue en la pagina siguiente
+                break
+            if estado == PCBState.TERMINATED:
+                cursor[1] = None
+            else:
+                cursor[1] = next(cursor[0], None)
+        return cells
 
-        # -- Header --
-        header = "  PID   |"
-        max_ticks = 0
 
-        # cantidad de ticks recorridos
-        for _, events in self.timeline.items():
-            max_tick_from_event = max(tick for tick, _ in events)
-            max_ticks = max(max_ticks, max_tick_from_event)
+## GanttChart con almacenamiento columnar (numpy): los cambios de estado se guardan en tres
+## arrays que crecen duplicando su capacidad (pid, tick, codigo de estado uint8) y las metricas
+## se calculan con operaciones vectorizadas en vez de recorrer los intervalos en Python
+class ColumnarGanttChart(GanttChart):
 
-        for tick in range(max_ticks):
-            header += " TICK {0:<3}|".format(tick)
-        print(header)
+    STATES = list(PCBState)
+    STATE_CODES = {estado: code for code, estado in enumerate(PCBState)}
+    NO_STATE = 255
 
-        # -- Rows --
-        for pid, events in self.timeline.items():
-            # PID del procesos
-            row = "  {0:<3}   |".format(pid)
+    def __init__(self, capacity = 4096):
+        if np is None:
+            raise ImportError("ColumnarGanttChart necesita numpy")
+        super().__init__()
+        self._size = 0
+        self._pidColumn = np.empty(capacity, dtype=np.int64)
+        self._tickColumn = np.empty(capacity, dtype=np.int64)
+        self._stateColumn = np.empty(capacity, dtype=np.uint8)
+        # pid -> codigo del ultimo estado registrado (en orden de aparicion)
+        self._lastState = dict()
 
-            # primeras 3 letras del estado del proceso en el respectivo tick
-            event_dict = {tick: estado.value[:3] for tick, estado in events}
-            ter_found = False
-            for tick in range(max_ticks):
-                if ter_found:
-                    row += "         |"
-                else:
-                    estado = event_dict.get(tick, "   ")
-                    row += "   {0}   |".format(estado)
-                    if estado == "TER":
-                        ter_found = True
-            print(row)
+    def log(self, pid, estado, tick):
+        code = self.STATE_CODES[estado]
+        if self._lastState.get(pid) != code:
+            if self._size == len(self._pidColumn):
+                self._grow()
+            self._pidColumn[self._size] = pid
+            self._tickColumn[self._size] = tick
+            self._stateColumn[self._size] = code
+            self._size += 1
+            self._lastState[pid] = code
+        self.sampled(tick)
+
+    def _grow(self):
+        capacity = 2 * len(self._pidColumn)
+        for name in ('_pidColumn', '_tickColumn', '_stateColumn'):
+            column = getattr(self, name)
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[:self._size] = column[:self._size]
+            setattr(self, name, grown)
+
+    def pids(self):
+        return list(self._lastState.keys())
+
+    def intervals(self, pid):
+        rows = np.nonzero(self._pidColumn[:self._size] == pid)[0]
+        ticks = self._tickColumn[rows].tolist()
+        states = self._stateColumn[rows].tolist()
+        for i, tick in enumerate(ticks):
+            end = ticks[i + 1] if i + 1 < len(ticks) else self._lastTick + 1
+            yield (tick, end, self.STATES[states[i]])
+
+    ## los intervalos de todos los procesos ordenados por pid (y por tick dentro de cada pid):
+    ## (pids unicos, indice de pid de cada intervalo, tickInicial, tickFinal, estado)
+    def _runs(self):
+        n = self._size
+        # las filas se agregan en orden de tick: un sort estable por pid mantiene ese orden
+        order = np.argsort(self._pidColumn[:n], kind='stable')
+        pids = self._pidColumn[:n][order]
+        starts = self._tickColumn[:n][order]
+        states = self._stateColumn[:n][order]
+        ends = np.full(n, self._lastTick + 1, dtype=np.int64)
+        if n > 1:
+            samePid = pids[:-1] == pids[1:]
+            ends[:-1] = np.where(samePid, starts[1:], self._lastTick + 1)
+        uniquePids, pidIndex = np.unique(pids, return_inverse=True)
+        return uniquePids, pidIndex, starts, ends, states
+
+    ## matriz pid x estado con la cantidad de ticks que cada proceso paso en cada estado
+    def stateTimes(self):
+        uniquePids, pidIndex, starts, ends, states = self._runs()
+        return uniquePids, self._timesPerState(len(uniquePids), pidIndex, starts, ends, states)
+
+    def _timesPerState(self, count, pidIndex, starts, ends, states):
+        cells = pidIndex * len(self.STATES) + states
+        times = np.bincount(cells, weights=ends - starts, minlength=count * len(self.STATES))
+        return times.reshape(count, len(self.STATES)).astype(np.int64)
+
+    ## metricas vectorizadas: arrays alineados con 'pids' (NaN si el proceso no termino/no corrio)
+    def metrics(self):
+        uniquePids, pidIndex, starts, ends, states = self._runs()
+        count = len(uniquePids)
+        times = self._timesPerState(count, pidIndex, starts, ends, states)
+
+        arrival = np.zeros(count, dtype=np.int64)
+        firstRows = np.unique(pidIndex, return_index=True)[1]
+        arrival[pidIndex[firstRows]] = starts[firstRows]
+
+        turnaround = np.full(count, np.nan)
+        terminated = states == self.STATE_CODES[PCBState.TERMINATED]
+        turnaround[pidIndex[terminated]] = starts[terminated] - arrival[pidIndex[terminated]]
+
+        response = np.full(count, np.nan)
+        running = states == self.STATE_CODES[PCBState.RUNNING]
+        runningPids, firstRunning = np.unique(pidIndex[running], return_index=True)
+        response[runningPids] = starts[running][firstRunning] - arrival[runningPids]
+
+        deadline = np.array([self._deadlines.get(pid, np.nan) for pid in uniquePids.tolist()], dtype=np.float64)
+        # NaN si no tiene deadline o no termino
+        lateness = arrival + turnaround - deadline
+
+        return {
+            'pids': uniquePids,
+            'turnaround': turnaround,
+            'waiting': times[:, self.STATE_CODES[PCBState.READY]],
+            'response': response,
+            'deadline': deadline,
+            'lateness': lateness,
+        }
+
+    def summary(self):
+        metrics = self.metrics()
+        order = {pid: i for i, pid in enumerate(metrics['pids'].tolist())}
+        pids = self.pids()
+        rows = [order[pid] for pid in pids]
+
+        def column(values):
+            return [None if value != value else int(value) for value in values[rows].tolist()]
+
+        return {
+            'pids': pids,
+            'turnaround': column(metrics['turnaround']),
+            'waiting': column(metrics['waiting']),
+            'response': column(metrics['response']),
+            'deadline': column(metrics['deadline']),
+            'lateness': column(metrics['lateness']),
+        }
+
+    def cpuUtilization(self, window = 1):
+        _, _, starts, ends, states = self._runs()
+        length = self._lastTick + 1
+        running = states == self.STATE_CODES[PCBState.RUNNING]
+        # +1 donde empieza cada intervalo RUNNING, -1 donde termina: la suma acumulada es
+        # la cantidad de procesos corriendo en cada tick
+        delta = np.bincount(starts[running], minlength=length + 1) - np.bincount(ends[running], minlength=length + 1)
+        busy = (np.cumsum(delta)[:length] > 0).astype(np.float64)
+        windows = -(-length // window)
+        padded = np.zeros(windows * window)
+        padded[:length] = busy
+        sizes = np.full(windows, window, dtype=np.float64)
+        if length % window:
+            sizes[-1] = length % window
+        return (padded.reshape(windows, window).sum(axis=1) / sizes).tolist()
+
+    ## matriz pid x tick (uint8, codigos de STATES; NO_STATE antes de que el proceso aparezca)
+    ## para la ventana de ticks [startTick, endTick)
+    def stateMatrix(self, startTick = 0, endTick = None):
+        if endTick is None:
+            endTick = self._lastTick + 1
+        uniquePids, pidIndex, starts, ends, states = self._runs()
+        width = max(endTick - startTick, 0)
+        inWindow = (starts < endTick) & (ends > startTick)
+        rows = pidIndex[inWindow]
+        columns = np.maximum(starts[inWindow], startTick) - startTick
+        # marcamos donde empieza cada intervalo y propagamos hacia la derecha
+        marks = np.full((len(uniquePids), width), -1, dtype=np.int64)
+        marks[rows, columns] = np.arange(len(rows))
+        marks = np.maximum.accumulate(marks, axis=1)
+        windowStates = states[inWindow]
+        matrix = np.full((len(uniquePids), width), self.NO_STATE, dtype=np.uint8)
+        filled = marks >= 0
+        matrix[filled] = windowStates[marks[filled]]
+        return uniquePids, matrix
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+import random
+from hardware import *
+from so import *
+
+
+## Distribuciones (para los largos de rafaga, cantidad de I/O, tamaño de los grupos de llegada)
+## se describen con tuplas, asi se pueden serializar para mandarlas a otro proceso:
+##   - ('constant', valor)
+##   - ('uniform', minimo, maximo)       enteros entre minimo y maximo (incluidos)
+##   - ('exponential', media)           redondeada al entero mas cercano
+##   - ('choice', valor1, valor2, ...)  uno de los valores con la misma probabilidad
+def sample(r, distribution):
+    kind = distribution[0]
+    if kind == 'constant':
+        return distribution[1]
+    if kind == 'uniform':
+        return r.randint(distribution[1], distribution[2])
+    if kind == 'exponential':
+        return int(round(r.expovariate(1 / distribution[1])))
+    if kind == 'choice':
+        return r.choice(distribution[1:])
+    raise ValueError("Distribucion desconocida: {kind}".format(kind=kind))
+
+
+def mean(distribution):
+    kind = distribution[0]
+    if kind == 'constant':
+        return distribution[1]
+    if kind == 'uniform':
+        return (distribution[1] + distribution[2]) / 2
+    if kind == 'exponential':
+        return distribution[1]
+    if kind == 'choice':
+        return sum(distribution[1:]) / len(distribution[1:])
+    raise ValueError("Distribucion desconocida: {kind}".format(kind=kind))
+
+
+## Generador de workloads sinteticos, siempre el mismo para la misma semilla:
+##   - count: cantidad de programas
+##   - arrivalRate: llegadas por tick (proceso de Poisson); None para que lleguen todos en el tick 0
+##   - arrivalBatch: cuantos programas llegan juntos en cada llegada (llegadas en rafagas)
+##   - cpuBurst: largo de cada rafaga de CPU (minimo 1)
+##   - ioOperations: cantidad de operaciones de I/O del programa (una entre cada par de rafagas)
+##   - ioBurst: ticks que tarda el dispositivo en cada operacion de I/O (minimo 1);
+##     None para que todas tarden el tiempo fijo del dispositivo
+##   - priorities: peso de cada prioridad, de la 0 a la 4
+## Los programas se generan de a uno y recien cuando se necesitan: un workload de 100k programas
+## no ocupa memoria hasta que se recorre, y submit los va escribiendo en el fileSystem a medida que llegan
+class SyntheticWorkload():
+
+    def __init__(self, count, seed = 0, arrivalRate = None, arrivalBatch = ('constant', 1),
+                 cpuBurst = ('uniform', 1, 8), ioOperations = ('uniform', 0, 3), priorities = (1, 1, 1, 1, 1),
+                 ioBurst = None):
+        self._count = count
+        self._seed = seed
+        self._arrivalRate = arrivalRate
+        self._arrivalBatch = arrivalBatch
+        self._cpuBurst = cpuBurst
+        self._ioOperations = ioOperations
+        self._priorities = list(priorities)
+        self._ioBurst = ioBurst
+
+    def __len__(self):
+        return self._count
+
+    ## programas como los que recibe Scenario: (instrucciones, prioridad, tickDeLlegada), en orden de llegada
+    def __iter__(self):
+        r = random.Random(self._seed)
+        tick = 0.0
+        generated = 0
+        while generated < self._count:
+            if self._arrivalRate is not None:
+                tick += r.expovariate(self._arrivalRate)
+            batch = min(max(sample(r, self._arrivalBatch), 1), self._count - generated)
+            for i in range(batch):
+                instructions, priority = self._program(r)
+                yield instructions, priority, int(tick)
+            generated += batch
+
+    def _program(self, r):
+        instructions = [ASM.CPU(max(sample(r, self._cpuBurst), 1))]
+        for i in range(max(sample(r, self._ioOperations), 0)):
+            instructions.append(self._io(r))
+            instructions.append(ASM.CPU(max(sample(r, self._cpuBurst), 1)))
+        priority = r.choices(range(len(self._priorities)), weights=self._priorities)[0]
+        return instructions, priority
+
+    def _io(self, r):
+        if self._ioBurst is None:
+            return ASM.IO()
+        return ASM.IO(max(sample(r, self._ioBurst), 1))
+
+    ## ticks de CPU y de dispositivo de I/O que pide un programa en promedio
+    def meanDemand(self):
+        ios = mean(self._ioOperations)
+        cpu = max(mean(self._cpuBurst), 1) * (ios + 1) + ios + 1
+        if self._ioBurst is None:
+            ioTicks = PrinterIODevice.DEVICE_TIME
+        else:
+            ioTicks = max(mean(self._ioBurst), 1)
+        return cpu, ioTicks * ios
+
+    ## carga los programas en el kernel a medida que llegan: cada llegada escribe su programa en
+    ## el fileSystem, lo corre y programa la llegada siguiente en el clock (nunca hay mas de una
+    ## llegada pendiente ni programas generados antes de tiempo). Cuando el proceso termina su
+    ## programa se borra del fileSystem: solo estan en memoria los de los procesos vivos
+    def submit(self, kernel, prefix = "c:/syn"):
+        programs = enumerate(iter(self))
+        pending = next(programs, None)
+        # paths de los programas de este workload que todavia estan en el fileSystem
+        live = set()
+
+        def reaped(pcb):
+            if pcb.path in live:
+                live.discard(pcb.path)
+                kernel.fileSystem.delete(pcb.path)
+
+        def arrive():
+            nonlocal pending
+            tick = pending[1][2]
+            while pending is not None and pending[1][2] == tick:
+                i, (instructions, priority, _) = pending
+                path = "{prefix}{i}.exe".format(prefix=prefix, i=i)
+                kernel.fileSystem.write(path, Program(instructions))
+                live.add(path)
+                kernel.run(path, priority)
+                pending = next(programs, None)
+            if pending is not None:
+                kernel.hardware.clock.schedule(pending[1][2], arrive)
+
+        if pending is not None:
+            kernel.addReapListener(reaped)
+            kernel.hardware.clock.schedule(pending[1][2], arrive)
+
+    def __repr__(self):
+        return "SyntheticWorkload(count={count}, seed={seed})".format(count=self._count, seed=self._seed)